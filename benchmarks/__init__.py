@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+"""
+    benchmarks
+    ~~~~~~~~~~
+
+    Reproducible benchmarks for the REST API and the model event listeners.
+
+    Usage::
+
+        python -m benchmarks run --scale small --output before.json
+        python -m benchmarks run --scale small --output after.json
+        python -m benchmarks compare before.json after.json
+
+    Pass ``--database-url postgresql://...`` to run against a local
+    PostgreSQL database instead of an in-memory SQLite one.
+
+    :copyright: (c) 2017 by Augusto Roccasalva
+    :license: MIT, see LICENSE for more details.
+"""
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import sys
+
+from . import api, encoders, models, startup
+from .runner import metadata, dump, compare
+from .seed import seed, volumes_for, SCALES
+
+
+def _config(database_url, cache):
+    from nas.config import TestingConfig
+
+    class BenchmarkConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = (database_url or
+                                   TestingConfig.SQLALCHEMY_DATABASE_URI)
+        RESPONSE_CACHE_TYPE = 'lru' if cache else None
+
+    return BenchmarkConfig
+
+
+def run(args):
+    from nas.application import create_app
+    from nas.models import db
+
+    app = create_app(_config(args.database_url, args.cache))
+    volumes = volumes_for(args.scale)
+    results = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(volumes, seed=args.seed)
+        for suite in (api, models):
+            if args.suite in (None, suite.__name__.rsplit('.', 1)[-1]):
+                results.update(suite.run(app, volumes, args.iterations))
+        database = db.engine.url.get_backend_name()
+
+    meta = metadata(scale=args.scale, volumes=volumes, database=database,
+                    iterations=args.iterations, cache=args.cache)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            dump(results, meta, fp)
+    for name, r in sorted(results.items()):
+        print('{:40} median {:9.3f} ms  p95 {:9.3f} ms  {:9.1f} ops/s'.format(
+            name, r['median'] * 1000, r['p95'] * 1000, r['ops_per_sec']))
+
+
+def run_startup(args):
+    results = startup.run(args.iterations)
+    meta = metadata(suite='startup', iterations=args.iterations)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            dump(results, meta, fp)
+    for name, r in sorted(results.items()):
+        print('{:40} median {:9.3f} ms  p95 {:9.3f} ms'.format(
+            name, r['median'] * 1000, r['p95'] * 1000))
+
+
+def run_json(args):
+    results = encoders.run(args.rows, args.iterations)
+    meta = metadata(suite='json', rows=args.rows, iterations=args.iterations)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            dump(results, meta, fp)
+    for name, r in sorted(results.items()):
+        print('{:40} median {:9.3f} ms  p95 {:9.3f} ms'.format(
+            name, r['median'] * 1000, r['p95'] * 1000))
+
+
+def run_compare(args):
+    with open(args.old) as fp:
+        old = json.load(fp)
+    with open(args.new) as fp:
+        new = json.load(fp)
+    regressed = False
+    for name, a, b, ratio, worse in compare(old, new, args.threshold):
+        regressed = regressed or worse
+        print('{:40} {:9.3f} ms -> {:9.3f} ms  x{:5.2f}{}'.format(
+            name, a * 1000, b * 1000, ratio or 0, '  REGRESSION' if worse else ''))
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    sub = parser.add_subparsers(dest='command')
+
+    p = sub.add_parser('run', help='seed a database and run the benchmarks')
+    p.add_argument('--scale', default='small', choices=sorted(SCALES))
+    p.add_argument('--iterations', type=int, default=20)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--suite', choices=('api', 'models'))
+    p.add_argument('--cache', action='store_true',
+                   help='enable the response cache')
+    p.add_argument('--database-url',
+                   help='database to use, it is dropped and recreated '
+                        '(default: in-memory SQLite)')
+    p.add_argument('--output', help='write JSON results to this file')
+
+    p = sub.add_parser('startup', help='measure import and cold start times')
+    p.add_argument('--iterations', type=int, default=10)
+    p.add_argument('--output', help='write JSON results to this file')
+
+    p = sub.add_parser('json', help='measure JSON encoding of API payloads')
+    p.add_argument('--rows', type=int, default=5000,
+                   help='bank accounts in the encoded list')
+    p.add_argument('--iterations', type=int, default=20)
+    p.add_argument('--output', help='write JSON results to this file')
+
+    p = sub.add_parser('compare', help='compare two JSON result files')
+    p.add_argument('old')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=0.10,
+                   help='slowdown ratio reported as regression')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    elif args.command == 'startup':
+        return run_startup(args)
+    elif args.command == 'json':
+        return run_json(args)
+    elif args.command == 'compare':
+        return run_compare(args)
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+
+from .runner import measure
+
+
+def _get(client, url):
+    def fn():
+        resp = client.get(url)
+        assert resp.status_code == 200, (url, resp.status_code)
+    return fn
+
+
+def run(app, volumes, iterations):
+    """Latency of the REST endpoints, measured through the WSGI test client."""
+    client = app.test_client()
+    cases = [
+        ('api.banks.list', '/api/banks'),
+        ('api.banks.list_sorted', '/api/banks?sort=name'),
+        ('api.banks.get', '/api/banks/1'),
+        ('api.banks.accounts', '/api/banks/1/accounts'),
+        ('api.bank_accounts.list', '/api/bank_accounts'),
+        ('api.bank_accounts.list_500', '/api/bank_accounts?limit=500'),
+    ]
+    results = {}
+    for name, url in cases:
+        results[name] = measure(_get(client, url), iterations)
+
+    counter = itertools.count()
+
+    def setup():
+        n = next(counter)
+        return ([{'name': u'Bulk {}-{}'.format(n, i)} for i in range(500)],)
+
+    def bulk_create(rows):
+        resp = client.post('/api/banks/bulk', json=rows)
+        assert resp.status_code == 201, resp.status_code
+
+    results['api.banks.bulk_500'] = measure(bulk_create, iterations,
+                                            setup=setup)
+    return results
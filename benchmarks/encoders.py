@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""
+JSON encoding micro-benchmark: a `BankAccountSchema` list, dumped once, is
+encoded with flask's `json.dumps` (the encoder used before
+`nas.utils.encoders`) and with each available backend.
+"""
+
+from .runner import measure
+
+
+def _accounts(rows):
+    from nas.models import Bank, BankAccount, Supplier
+
+    banks = [Bank(id=i, name=u'Banco {}'.format(i)) for i in range(1, 51)]
+    accounts = []
+    for i in range(1, rows + 1):
+        supplier = Supplier(id=i, rz=u'Proveedor {} S.A.'.format(i))
+        accounts.append(BankAccount(
+            id=i, branch=u'Central', acc_type=u'CC',
+            number=u'{:010d}'.format(i), owner=u'Titular {}'.format(i),
+            bank=banks[i % len(banks)], entity=supplier))
+    return accounts
+
+
+def _encoders():
+    from flask import json
+    from nas.utils.encoders import stdlib_dumps, orjson_dumps
+
+    encoders = {
+        'flask': lambda data: json.dumps(data).encode('utf-8'),
+        'stdlib': stdlib_dumps,
+    }
+    try:
+        encoders['orjson'] = orjson_dumps()
+    except ImportError:
+        pass
+    return encoders
+
+
+def run(rows, iterations):
+    from nas.application import create_app
+    from nas.config import TestingConfig
+    from nas.api.bank_account import BankAccountSchema
+    from nas.models import db
+
+    app = create_app(TestingConfig)
+    results = {}
+    with app.app_context():
+        db.create_all()  # model validators look up duplicates
+        data = BankAccountSchema(many=True).dump(_accounts(rows)).data
+        for name, encode in sorted(_encoders().items()):
+            results['json.bank_accounts_{}.{}'.format(rows, name)] = \
+                measure(lambda: encode(data), iterations)
+    return results
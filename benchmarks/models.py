@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+from datetime import date, timedelta
+from decimal import Decimal
+
+from nas.models import db, Supplier, Document, Payment
+
+from .runner import measure
+
+
+DOCUMENTS = 100
+
+_counter = itertools.count(1)
+
+
+def _new_supplier():
+    supplier = Supplier(rz=u'Bench {}'.format(next(_counter)))
+    db.session.add(supplier)
+    db.session.flush()
+    return supplier
+
+
+def _documents(supplier, n=DOCUMENTS):
+    today = date.today()
+    return [Document(supplier=supplier, point_sale=1, number=i,
+                     total=Decimal('100.00'), issue_date=today,
+                     expiration_date=today + timedelta(days=i % 60))
+            for i in range(n)]
+
+
+def _supplier_with_documents():
+    supplier = _new_supplier()
+    documents = _documents(supplier)
+    db.session.commit()
+    return supplier, documents
+
+
+def run(app, volumes, iterations):
+    """Bulk document and payment operations going through the ORM listeners."""
+    results = {}
+
+    def create(supplier):
+        _documents(supplier)
+        db.session.commit()
+
+    results['documents.create_{}'.format(DOCUMENTS)] = measure(
+        create, iterations, setup=lambda: (_new_supplier(),))
+
+    def pay(supplier, documents):
+        for document in documents:
+            document.doc_status = Document.STATUS_PAID
+        db.session.commit()
+
+    results['documents.pay_{}'.format(DOCUMENTS)] = measure(
+        pay, iterations, setup=_supplier_with_documents)
+
+    def add_payment(supplier, documents):
+        payment = Payment(amount=Decimal('50.00'), date=date.today())
+        payment.add_documents(documents)
+        db.session.add(payment)
+        db.session.commit()
+
+    results['payments.add_documents_{}'.format(DOCUMENTS)] = measure(
+        add_payment, iterations, setup=_supplier_with_documents)
+
+    def load_balances():
+        db.session.expunge_all()
+        Document.load_balances(Document.query.limit(2000))
+
+    results['documents.load_balances_2000'] = measure(load_balances,
+                                                      iterations)
+    return results
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+
+def stats(timings):
+    timings = sorted(timings)
+    n = len(timings)
+    mean = sum(timings) / n
+    return {
+        'iterations': n,
+        'min': timings[0],
+        'max': timings[-1],
+        'mean': mean,
+        'median': timings[n // 2],
+        'p95': timings[min(n - 1, int(n * 0.95))],
+        'ops_per_sec': 1 / mean if mean else None,
+    }
+
+
+def measure(fn, iterations=20, warmup=2, setup=None):
+    """
+    Times `fn` over `iterations` runs after `warmup` untimed ones.
+
+    When given, `setup` is called (untimed) before each run and its return
+    value is passed as positional arguments to `fn`.
+    """
+    timings = []
+    for i in range(warmup + iterations):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            timings.append(elapsed)
+    return stats(timings)
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL)\
+                         .decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(**extra):
+    import sqlalchemy
+    meta = {
+        'revision': _git_revision(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlalchemy': sqlalchemy.__version__,
+    }
+    meta.update(extra)
+    return meta
+
+
+def dump(results, meta, fp):
+    json.dump({'meta': meta, 'results': results}, fp, indent=2,
+              sort_keys=True)
+
+
+def compare(old, new, threshold=0.10, key='median'):
+    """
+    Compares two result documents and returns a list of rows
+    ``(name, old, new, ratio, regressed)`` for benchmarks present in both.
+    """
+    rows = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        a = old['results'][name][key]
+        b = new['results'][name][key]
+        ratio = b / a if a else None
+        rows.append((name, a, b, ratio,
+                     ratio is not None and ratio > 1 + threshold))
+    return rows
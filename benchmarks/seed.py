@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from nas.models import (db, Entity, Supplier, Document, Payment,
+                        DocumentPayment, Bank, BankAccount)
+
+
+#: rows generated for each table at scale 1
+VOLUMES = {
+    'banks': 50,
+    'accounts': 2000,
+    'suppliers': 200,
+    'documents': 10000,
+    'payments': 2000,
+}
+
+SCALES = {
+    'tiny': 0.1,
+    'small': 1,
+    'medium': 10,
+    'large': 50,
+}
+
+BATCH_SIZE = 5000
+
+
+def volumes_for(scale):
+    factor = SCALES[scale] if isinstance(scale, str) else scale
+    return dict((k, max(1, int(v * factor))) for k, v in VOLUMES.items())
+
+
+def _insert(table, rows):
+    for i in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(table.insert(), rows[i:i+BATCH_SIZE])
+
+
+def seed(volumes, seed=0):
+    """
+    Fills the database with deterministic data (for a given `seed`) using
+    Core inserts, keeping Supplier.debt/expired/expiration_date consistent
+    with the generated documents and payments.
+    """
+    rnd = random.Random(seed)
+    today = date.today()
+
+    banks = [{'id': i, 'name': u'Banco {}'.format(i),
+              'bcra_code': u'{:05d}'.format(i), 'cuit': None}
+             for i in range(1, volumes['banks'] + 1)]
+    _insert(Bank.__table__, banks)
+
+    supplier_ids = list(range(1, volumes['suppliers'] + 1))
+    _insert(Entity.__table__, [{'id': i, 'name_1': u'Proveedor {}'.format(i),
+                                'entity_type': u'supplier'}
+                               for i in supplier_ids])
+
+    debt = dict((i, Decimal(0)) for i in supplier_ids)
+    expired = dict((i, Decimal(0)) for i in supplier_ids)
+    expiration = {}
+
+    documents = []
+    for i in range(1, volumes['documents'] + 1):
+        supplier_id = rnd.choice(supplier_ids)
+        issue_date = today - timedelta(days=rnd.randint(0, 365))
+        expiration_date = issue_date + timedelta(days=rnd.choice((0, 30, 60)))
+        total = Decimal(rnd.randint(100, 100000)) / 100
+        if expiration_date < today - timedelta(days=90):
+            status = Document.STATUS_PAID
+        elif expiration_date < today:
+            status = Document.STATUS_EXPIRED
+        else:
+            status = Document.STATUS_PENDING
+        if status != Document.STATUS_PAID:
+            debt[supplier_id] += total
+            if status == Document.STATUS_EXPIRED:
+                expired[supplier_id] += total
+            current = expiration.get(supplier_id)
+            if current is None or expiration_date < current:
+                expiration[supplier_id] = expiration_date
+        documents.append({
+            'id': i, 'supplier_id': supplier_id, 'point_sale': 1,
+            'number': i, 'total': total, 'doc_status': status,
+            'doc_type': Document.TYPE_FACTURA_A, 'issue_date': issue_date,
+            'expiration_date': expiration_date,
+        })
+
+    _insert(Supplier.__table__, [{
+        'supplier_id': i, 'debt': debt[i], 'expired': expired[i],
+        'expiration_date': expiration.get(i), 'delivery_included': False,
+        'sup_type': Supplier.TYPE_PRODUCTS,
+    } for i in supplier_ids])
+    _insert(Document.__table__, documents)
+
+    payments, document_payments = [], []
+    for i in range(1, volumes['payments'] + 1):
+        document = rnd.choice(documents)
+        amount = (document['total'] / 2).quantize(Decimal('0.01'))
+        payments.append({'id': i, 'amount': amount,
+                         'date': document['issue_date']})
+        document_payments.append({'document_id': document['id'],
+                                  'payment_id': i, 'amount': amount})
+    _insert(Payment.__table__, payments)
+    _insert(DocumentPayment.__table__, document_payments)
+
+    _insert(BankAccount.__table__, [{
+        'id': i, 'bank_id': rnd.randint(1, volumes['banks']),
+        'entity_id': rnd.choice(supplier_ids), 'branch': u'Central',
+        'acc_type': u'CC', 'number': u'{:010d}'.format(i),
+        'owner': u'Titular {}'.format(i), 'cbu': None,
+    } for i in range(1, volumes['accounts'] + 1)])
+
+    db.session.commit()
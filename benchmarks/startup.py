@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""
+Import time and cold start benchmarks. Each run is a fresh interpreter (or a
+forked child of a preloaded one), so results include interpreter startup.
+"""
+
+import os
+import subprocess
+import sys
+
+from .runner import measure
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_FIRST_REQUEST = '''
+from nas.models import db
+with app.app_context():
+    db.create_all()
+assert app.test_client().get('/api/banks').status_code == 200
+'''
+
+_CREATE_APP = '''
+from nas.application import create_app
+from nas.config import TestingConfig
+app = create_app(TestingConfig)
+'''
+
+SCRIPTS = {
+    'startup.import_application': 'import nas.application',
+    'startup.import_commands': 'import nas.commands',
+    'startup.create_app': _CREATE_APP,
+    'startup.create_app_without_api': _CREATE_APP.replace(
+        'TestingConfig)', 'TestingConfig, with_api=False)'),
+    'startup.first_request': _CREATE_APP + _FIRST_REQUEST,
+}
+
+COMMANDS = {
+    'startup.cli_help': ['-m', 'nas.commands', 'dropdb', '--help'],
+}
+
+
+def _env():
+    env = dict(os.environ, TEST='yes')
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in [env.get('PYTHONPATH')] if p])
+    return env
+
+
+def _python(args, env):
+    subprocess.check_call([sys.executable] + args, cwd=ROOT, env=env,
+                          stdout=subprocess.DEVNULL)
+
+
+def _forked_first_request(app):
+    """Time to serve a first request from a worker forked after preload."""
+    def run():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with app.app_context():
+                    app.test_client().get('/api/banks')
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+    return run
+
+
+def _preloaded_app():
+    from sqlalchemy.orm import configure_mappers
+    from nas.application import create_app
+    from nas.config import TestingConfig
+    from nas.models import db
+
+    app = create_app(TestingConfig)
+    configure_mappers()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def run(iterations):
+    env = _env()
+    results = {}
+    for name, script in sorted(SCRIPTS.items()):
+        results[name] = measure(_python, iterations, warmup=1,
+                                setup=lambda: (['-c', script], env))
+    for name, args in sorted(COMMANDS.items()):
+        results[name] = measure(_python, iterations, warmup=1,
+                                setup=lambda: (args, env))
+    if hasattr(os, 'fork'):
+        results['startup.preforked_first_request'] = measure(
+            _forked_first_request(_preloaded_app()), iterations, warmup=1)
+    return results
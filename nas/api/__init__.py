@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, current_app, abort
 
 
 URL_PREFIX = '/api'
@@ -14,11 +14,28 @@ def index():
     })
 
 
+@api.route('/_metrics')
+def metrics():
+    metrics = current_app.extensions.get('nas_metrics')
+    if metrics is None:
+        abort(404)
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
 def configure_api(app):
     app.register_blueprint(api, url_prefix=URL_PREFIX)
     app.register_blueprint(bank_api, url_prefix=URL_PREFIX + '/banks')
     app.register_blueprint(bank_account_api, url_prefix=URL_PREFIX + '/bank_accounts')
+    app.register_blueprint(document_api, url_prefix=URL_PREFIX + '/documents')
+    app.register_blueprint(product_api, url_prefix=URL_PREFIX + '/products')
+    app.register_blueprint(supplier_api, url_prefix=URL_PREFIX + '/suppliers')
+    app.register_blueprint(purchase_order_api,
+                           url_prefix=URL_PREFIX + '/purchase_orders')
 
 
 from .bank import bank_api
 from .bank_account import bank_account_api
+from .document import document_api
+from .product import product_api
+from .supplier import supplier_api
+from .purchase_order import purchase_order_api
@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 
-from flask import abort
+from flask import abort, request
 from marshmallow import Schema, fields, validates, ValidationError
 from webargs.flaskparser import use_args
 
 
 from ..utils import RestBlueprint, update_model
-from ..models import Bank, BankAccount, db
-from .bank_account import BankAccountSchema
+from ..utils.query import paginate, sparse_fields, include_options
+from ..models import Bank, BankAccount, Entity, Address, Phone, Email, db
+from .bank_account import BankAccountSchema, INCLUDES as ACCOUNT_INCLUDES
 
 bank_api = RestBlueprint('api.bank', __name__)
 
+#: tables behind account listings, ?include= adds the entity ones
+ACCOUNT_TABLES = (Bank, BankAccount, Entity, Address, Phone, Email)
+
 
 class BankSchema(Schema):
 
@@ -20,10 +24,12 @@ class BankSchema(Schema):
     cuit = fields.String(length=11)
 
 
-@bank_api.route('')
+@bank_api.route('', cache=Bank)
 def list():
-    q = Bank.query.all()
-    return BankSchema(many=True).dump(q).data, 200, {'X-Total-Count': len(q)}
+    only, options = sparse_fields(BankSchema, Bank)
+    banks, headers = paginate(Bank.query.options(*options), Bank,
+                              sortable=('name',))
+    return BankSchema(many=True, only=only).dump(banks).data, 200, headers
 
 
 @bank_api.route('', methods=['POST'])
@@ -37,10 +43,26 @@ def create(properties):
     return BankSchema().dump(bank).data, 201
 
 
-@bank_api.route('/<int:id>', methods=['GET'])
+@bank_api.route('/bulk', methods=['POST'])
+def bulk_create():
+    data, errors = BankSchema(many=True, partial=True).load(
+        request.get_json(force=True) or [])
+    valid = [row for idx, row in enumerate(data) if idx not in errors]
+    created, model_errors = Bank.bulk_create(valid)
+    db.session.commit()
+
+    # report errors using the positions of the original request
+    positions = [idx for idx in range(len(data)) if idx not in errors]
+    for idx, errs in model_errors.items():
+        errors[positions[idx]] = errs
+    return {'created': created, 'errors': errors}, 201 if created else 400
+
+
+@bank_api.route('/<int:id>', methods=['GET'], cache=Bank)
 def get(id):
-    b = Bank.query.get_or_404(id)
-    return BankSchema().dump(b).data
+    only, options = sparse_fields(BankSchema, Bank)
+    b = Bank.query.options(*options).get_or_404(id)
+    return BankSchema(only=only).dump(b).data
 
 
 @bank_api.route('/<int:id>', methods=['PATCH'])
@@ -60,12 +82,16 @@ def delete(id):
     return '', 204
 
 
-@bank_api.route('/<int:id>/accounts')
+@bank_api.route('/<int:id>/accounts', cache=ACCOUNT_TABLES)
 def list_accounts(id):
     b = Bank.query.get_or_404(id)
-    return (BankAccountSchema(many=True).dump(b.accounts).data,
-            200,
-            {'X-Total-Count': len(b.accounts)})
+    only, options = sparse_fields(BankAccountSchema, BankAccount)
+    exclude, includes = include_options(BankAccount, ACCOUNT_INCLUDES)
+    accounts, headers = paginate(
+        BankAccount.query.with_parent(b).options(*(options + includes)),
+        BankAccount)
+    schema = BankAccountSchema(many=True, only=only, exclude=exclude)
+    return schema.dump(accounts).data, 200, headers
 
 @bank_api.route('/<int:id>/accounts/<int:acc_id>', methods=['DELETE'])
 def delete_account(id, acc_id):
@@ -4,7 +4,9 @@ from marshmallow import Schema, fields
 from webargs.flaskparser import use_args
 
 from ..utils import RestBlueprint, update_model
+from ..utils.query import paginate, sparse_fields, include_options
 from ..models import BankAccount, db
+from .entity import EntitySchema
 
 
 bank_account_api = RestBlueprint('api.bank_account', __name__)
@@ -18,13 +20,22 @@ class BankAccountSchema(Schema):
     number = fields.String()
     owner = fields.String()
     cbu = fields.String()
+    bank = fields.Nested('BankSchema', dump_only=True)
+    entity = fields.Nested(EntitySchema, dump_only=True)
+
+
+#: relationships that can be requested with ?include=
+INCLUDES = ('bank', 'entity', 'entity.address', 'entity.phone', 'entity.email')
 
 
 @bank_account_api.route('')
 def list():
-    q = BankAccount.query.all()
-    print("q:", q)
-    return BankAccountSchema(many=True).dump(q).data, 200, {'X-Total-Count': len(q)}
+    only, options = sparse_fields(BankAccountSchema, BankAccount)
+    exclude, includes = include_options(BankAccount, INCLUDES)
+    accounts, headers = paginate(
+        BankAccount.query.options(*(options + includes)), BankAccount)
+    schema = BankAccountSchema(many=True, only=only, exclude=exclude)
+    return schema.dump(accounts).data, 200, headers
 
 @bank_account_api.route('', methods=['POST'])
 @use_args(BankAccountSchema(strict=True, partial=True))
@@ -32,4 +43,4 @@ def create(properties):
     account = BankAccount(**properties)
     db.session.add(account)
     db.session.commit()
-    return BankAccountSchema().dump(account).data, 201
+    return BankAccountSchema(exclude=('bank', 'entity')).dump(account).data, 201
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from flask import Response, stream_with_context
+from marshmallow import fields, validate
+from webargs.fields import DelimitedList
+from webargs.flaskparser import use_args
+
+from ..utils import RestBlueprint
+from ..utils.compression import compress_response
+from ..exporter import iter_documents, FORMATS
+
+
+document_api = RestBlueprint('api.document', __name__)
+
+
+export_args = {
+    'format': fields.String(missing='ndjson',
+                            validate=validate.OneOf(sorted(FORMATS))),
+    'from': fields.Date(missing=None),
+    'to': fields.Date(missing=None),
+    'suppliers': DelimitedList(fields.Integer(), missing=None),
+}
+
+
+@document_api.route('/export')
+@use_args(export_args, locations=('query',))
+def export(args):
+    writer, mimetype = FORMATS[args['format']]
+    documents = iter_documents(args['from'], args['to'], args['suppliers'])
+    # built here, so not compressed by RestBlueprint
+    return compress_response(Response(stream_with_context(writer(documents)),
+                                      mimetype=mimetype))
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from marshmallow import Schema, fields
+
+
+class AddressSchema(Schema):
+
+    id = fields.Integer(dump_only=True)
+    street = fields.String()
+    streetnumber = fields.String()
+    city = fields.String()
+    province = fields.String()
+    zip_code = fields.String()
+    address_type = fields.String()
+
+
+class PhoneSchema(Schema):
+
+    id = fields.Integer(dump_only=True)
+    phone_type = fields.String()
+    number = fields.String()
+
+
+class EmailSchema(Schema):
+
+    id = fields.Integer(dump_only=True)
+    email_type = fields.String()
+    email = fields.String()
+
+
+class EntitySchema(Schema):
+
+    id = fields.Integer(dump_only=True)
+    entity_type = fields.String(dump_only=True)
+    full_name = fields.String(dump_only=True)
+    address = fields.Nested(AddressSchema, many=True, dump_only=True)
+    phone = fields.Nested(PhoneSchema, many=True, dump_only=True)
+    email = fields.Nested(EmailSchema, many=True, dump_only=True)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from flask import request
+from marshmallow import Schema, fields, validate
+from werkzeug.urls import url_encode
+from webargs.flaskparser import use_args
+
+from ..utils import RestBlueprint
+from ..models import Product, ProductSupplierInfo
+from ..reports import iter_reorder_suggestions
+
+product_api = RestBlueprint('api.product', __name__)
+
+
+class ProductSchema(Schema):
+
+    id = fields.Integer(dump_only=True)
+    code = fields.String(required=True)
+    description = fields.String(required=True)
+    brand = fields.String()
+
+
+class ReorderSchema(Schema):
+
+    product_id = fields.Integer()
+    code = fields.String()
+    description = fields.String()
+    supplier_id = fields.Integer()
+    supplier_code = fields.String()
+    base_cost = fields.Decimal(as_string=True)
+    minimum_purchase = fields.Integer()
+    leap_time = fields.Integer()
+    on_order = fields.Integer()
+    quantity = fields.Integer()
+    cost = fields.Decimal(as_string=True)
+    expected_date = fields.Date()
+
+
+search_args = {
+    'q': fields.String(required=True, validate=validate.Length(min=1)),
+    'limit': fields.Integer(missing=20, validate=validate.Range(1, 100)),
+    'offset': fields.Integer(missing=0, validate=validate.Range(min=0)),
+}
+
+
+@product_api.route('/search', cache=(Product, ProductSupplierInfo))
+@use_args(search_args, locations=('query',))
+def search(args):
+    limit, offset = args['limit'], args['offset']
+    products = Product.search(args['q']).offset(offset).limit(limit + 1).all()
+    headers = {}
+    if len(products) > limit:
+        products = products[:limit]
+        query = request.args.copy()
+        query['offset'] = offset + limit
+        query['limit'] = limit
+        headers['Link'] = '<{}?{}>; rel="next"'.format(request.base_url,
+                                                     url_encode(query))
+    return ProductSchema(many=True).dump(products).data, 200, headers
+
+
+@product_api.route('/reorder', stream=True)
+def reorder():
+    schema = ReorderSchema()
+    return (schema.dump(s).data for s in iter_reorder_suggestions())
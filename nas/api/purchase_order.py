@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+from marshmallow import Schema, fields, validate
+from sqlalchemy.orm import selectinload
+from webargs.flaskparser import use_args
+
+from ..utils import RestBlueprint
+from ..models import db, PurchaseOrder, receive_items
+
+purchase_order_api = RestBlueprint('api.purchase_order', __name__)
+
+
+class PurchaseOrderItemSchema(Schema):
+
+    id = fields.Integer(dump_only=True)
+    sku = fields.String()
+    description = fields.String()
+    quantity = fields.Integer()
+    quantity_received = fields.Integer(dump_only=True)
+    quantity_returned = fields.Integer(dump_only=True)
+    pending_quantity = fields.Integer(dump_only=True)
+
+
+class PurchaseOrderSchema(Schema):
+
+    id = fields.Integer(dump_only=True)
+    supplier_id = fields.Integer(required=True)
+    point_sale = fields.Integer(required=True)
+    number = fields.Integer(required=True)
+    po_status = fields.String()
+    open_date = fields.Date()
+    confirm_date = fields.Date()
+    receival_date = fields.Date(dump_only=True)
+    items = fields.Nested(PurchaseOrderItemSchema, many=True)
+
+
+class ReceivedItemSchema(Schema):
+
+    id = fields.Integer(required=True)
+    received = fields.Integer(missing=0, validate=validate.Range(min=0))
+    returned = fields.Integer(missing=0, validate=validate.Range(min=0))
+
+
+class ReceivingSchema(Schema):
+
+    receival_date = fields.Date(missing=None)
+    items = fields.Nested(ReceivedItemSchema, many=True, required=True,
+                          validate=validate.Length(min=1))
+
+
+@purchase_order_api.route('/receive', methods=['POST'])
+@use_args(ReceivingSchema(strict=True))
+def receive(delivery):
+    orders, errors = receive_items(delivery['items'],
+                                   delivery['receival_date'])
+    if errors:
+        db.session.rollback()
+        return {'errors': errors}, 400
+    db.session.commit()
+    orders = PurchaseOrder.query.options(selectinload(PurchaseOrder.items))\
+                                .filter(PurchaseOrder.id.in_(orders))\
+                                .order_by(PurchaseOrder.id)
+    return PurchaseOrderSchema(many=True).dump(orders).data
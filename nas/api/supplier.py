@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+from flask import current_app
+from marshmallow import (Schema, fields, validate, validates_schema,
+                         ValidationError)
+from webargs.flaskparser import use_args
+
+from ..utils import RestBlueprint
+from ..models import db, Supplier, change_prices, load_price_list
+from ..models.pricing import MAX_COST
+from ..reports import supplier_aging
+
+supplier_api = RestBlueprint('api.supplier', __name__)
+
+
+class AgingSchema(Schema):
+
+    supplier_id = fields.Integer()
+    supplier = fields.String()
+    current = fields.Decimal(as_string=True)
+    days_0_30 = fields.Decimal(as_string=True)
+    days_31_60 = fields.Decimal(as_string=True)
+    days_61_90 = fields.Decimal(as_string=True)
+    days_over_90 = fields.Decimal(as_string=True)
+    total = fields.Decimal(as_string=True)
+
+
+aging_args = {
+    'as_of': fields.Date(missing=None),
+}
+
+
+@supplier_api.route('/aging')
+@use_args(aging_args, locations=('query',))
+def aging(args):
+    rows = supplier_aging(args['as_of'],
+                          cache=current_app.config.get('AGING_CACHE', True))
+    return AgingSchema(many=True).dump(rows).data
+
+
+class PriceSchema(Schema):
+
+    code = fields.String(required=True, validate=validate.Length(min=1))
+    cost = fields.Decimal(required=True, validate=validate.Range(
+        min=0, max=MAX_COST - Decimal('0.01')))
+
+
+class PriceUpdateSchema(Schema):
+
+    percent = fields.Decimal(validate=validate.Range(min=-100))
+    prices = fields.Nested(PriceSchema, many=True)
+
+    @validates_schema
+    def validate_update(self, data):
+        if ('percent' in data) == ('prices' in data):
+            raise ValidationError("Either 'percent' or 'prices' must be "
+                                  "given")
+
+
+@supplier_api.route('/<int:id>/prices', methods=['POST'])
+@use_args(PriceUpdateSchema(strict=True))
+def update_prices(update, id):
+    Supplier.query.get_or_404(id)
+    if 'percent' in update:
+        updated, unknown = change_prices(id, update['percent']), []
+    else:
+        updated, unknown = load_price_list(
+            id, [(p['code'], p['cost']) for p in update['prices']])
+    db.session.commit()
+    return {'updated': updated, 'unknown': unknown}
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 
+import os
 import locale
-locale.setlocale(locale.LC_ALL, '')
 
 from flask import Flask, request
-from nas.api import configure_api
+from nas.config import engine_options, settings_from_env
 from nas.models import configure_db
+from nas.utils.cache import configure_cache
+from nas.utils.compression import configure_compression
+from nas.utils.encoders import configure_json
+from nas.utils.metrics import configure_metrics
+from nas.utils.query import configure_pagination
 from nas.utils.converters import (
     ListConverter, RangeConverter, RangeListConverter
 )
@@ -14,7 +19,12 @@ from nas.utils.converters import (
 DEFAULT_APPNAME = 'nobix-application-server'
 
 
-def create_app(config=None, app_name=None):
+def create_app(config=None, app_name=None, with_api=True):
+    """
+    Creates the application. With `with_api` false the REST blueprints (and
+    the schema libraries they need) aren't loaded, which is enough for CLI
+    commands working on the database.
+    """
 
     if app_name is None:
         app_name = DEFAULT_APPNAME
@@ -23,8 +33,15 @@ def create_app(config=None, app_name=None):
 
     configure_app(app, config)
     configure_db(app)
+    configure_cache(app)
+    configure_compression(app)
+    configure_json(app)
+    configure_metrics(app)
+    configure_pagination(app)
     # configure_auth(app)
-    configure_api(app)
+    if with_api:
+        from nas.api import configure_api
+        configure_api(app)
 
     return app
 
@@ -41,12 +58,20 @@ def configure_app(app, config=None):
                 app.config.from_object('nas.config.DevelopmentConfig')
                 app.logger.info("Config: Development")
             elif os.getenv('TEST') == 'yes':
-                app.config.from_object('nas.config.TestConfig')
+                app.config.from_object('nas.config.TestingConfig')
                 app.logger.info("Config: Test")
             else:
                 app.config.from_object('nas.config.ProductionConfig')
                 app.logger.info("Config: Production")
 
+    # read the environment when the app is created, not on config import
+    app.config.update(settings_from_env(app.config))
+    if app.config.get('ENGINE_OPTIONS_FROM_ENV'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(
+            app.config['SQLALCHEMY_DATABASE_URI'])
+
+    locale.setlocale(locale.LC_ALL, app.config.get('LOCALE', ''))
+
     # Add additional converters
     app.url_map.converters['list'] = ListConverter
     app.url_map.converters['range'] = RangeConverter
@@ -4,21 +4,27 @@
     nas.commands
     ~~~~~~~~~~~~
 
+    Management commands, run them with ``python -m nas.commands <command>``
+    or ``FLASK_APP=nas.commands flask <command>``.
+
+    Commands are plain click commands: with ``python -m nas.commands`` the
+    application is only created when a command runs (not for ``--help``) and
+    without the REST blueprints, which none of these commands need.
+
     :copyright: (c) 2017 by Augusto Roccasalva
     :license: MIT, see LICENSE for more details.
 """
 
 import click
+from flask.cli import FlaskGroup, with_appcontext
 
-from nas.application import create_app
-from nas.models import db
 
-app = create_app()
-
-@app.cli.command()
+@click.command()
 @click.option('--create-admin-user', is_flag=True)
+@with_appcontext
 def initdb(create_admin_user):
     """Creates database tables"""
+    from nas.models import db
     db.create_all()
     # from nas.models.product import create_primitive_units
     # create_primitive_units()
@@ -27,8 +33,166 @@ def initdb(create_admin_user):
     #     create_admin_user()
 
 
-@app.cli.command()
+@click.command()
+@with_appcontext
 def dropdb():
     """Drops all database tables"""
+    from nas.models import db
     if click.confirm("Are you sure ? You will lose all your data!"):
         db.drop_all()
+
+
+@click.command('import-suppliers')
+@click.argument('input', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Input format, guessed from the file extension by default')
+@click.option('--chunk-size', default=1000, help='Records per transaction')
+@click.option('--no-copy', is_flag=True,
+              help="Use INSERT instead of COPY on PostgreSQL")
+@with_appcontext
+def import_suppliers(input, fmt, chunk_size, no_copy):
+    """Imports suppliers from a CSV or NDJSON file ('-' for stdin)"""
+    from nas.models import db
+    from nas.importer import SupplierImporter, read_csv, read_ndjson
+
+    if fmt is None:
+        fmt = 'csv' if input.name.endswith('.csv') else 'ndjson'
+    records = read_csv(input) if fmt == 'csv' else read_ndjson(input)
+
+    def progress(imported, elapsed):
+        click.echo("{} suppliers imported in {:.1f}s ({:.0f}/s)".format(
+            imported, elapsed, imported / elapsed if elapsed else 0))
+
+    importer = SupplierImporter(db.session, chunk_size=chunk_size,
+                                use_copy=False if no_copy else None)
+    imported, errors = importer.import_records(records, progress)
+    for position, error in sorted(errors.items()):
+        click.echo("record {}: {}".format(position + 1, error), err=True)
+    click.echo("Done: {} imported, {} rejected".format(imported, len(errors)))
+
+
+@click.command('export-documents')
+@click.argument('output', type=click.File('w', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Output format, guessed from the file extension by default')
+@click.option('--from', 'date_from', help='First issue date (YYYY-MM-DD)')
+@click.option('--to', 'date_to', help='Last issue date (YYYY-MM-DD)')
+@click.option('--supplier', type=int, multiple=True,
+              help='Supplier id, may be repeated (default: all)')
+@with_appcontext
+def export_documents(output, fmt, date_from, date_to, supplier):
+    """Exports documents with payments and balances ('-' for stdout)"""
+    from datetime import datetime
+    from nas.exporter import iter_documents, FORMATS
+
+    if fmt is None:
+        fmt = 'csv' if output.name.endswith('.csv') else 'ndjson'
+    parse = lambda d: datetime.strptime(d, '%Y-%m-%d').date() if d else None
+    documents = iter_documents(parse(date_from), parse(date_to), supplier)
+    for chunk in FORMATS[fmt][0](documents):
+        output.write(chunk)
+
+
+@click.command('reindex-products')
+@with_appcontext
+def reindex_products():
+    """Rebuilds the product search index (SQLite only)"""
+    from nas.models.product import rebuild_search_index
+    rebuild_search_index()
+    click.echo("Product search index rebuilt")
+
+
+@click.command('expire-documents')
+@click.option('--as-of', help='Expire documents due before this date '
+                              '(YYYY-MM-DD, default: today)')
+@with_appcontext
+def expire_documents(as_of):
+    """Marks overdue pending documents as expired (run it daily)"""
+    from datetime import datetime
+    from nas.models import db, expire_documents
+
+    if as_of:
+        as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+    count = expire_documents(as_of)
+    db.session.commit()
+    click.echo("{} documents expired".format(count))
+
+
+@click.command('rebuild-on-order')
+@with_appcontext
+def rebuild_on_order():
+    """Recomputes pending quantities on order by supplier sku"""
+    from nas.models import db
+    from nas.models.order import rebuild_on_order
+
+    rebuild_on_order()
+    db.session.commit()
+    click.echo("Quantities on order rebuilt")
+
+
+@click.command('update-prices')
+@click.argument('supplier_id', type=int)
+@click.option('--percent', type=float,
+              help='Change all costs by this percentage (e.g. 12 or -5)')
+@click.option('--file', 'price_list', type=click.File('r', encoding='utf-8'),
+              help="CSV price list with 'code' and 'cost' columns")
+@with_appcontext
+def update_prices(supplier_id, percent, price_list):
+    """Updates supplier costs by a percentage or from a price list"""
+    import csv
+    from nas.models import db, change_prices, load_price_list
+    from nas.models.pricing import parse_price
+
+    if (percent is None) == (price_list is None):
+        raise click.UsageError("Give either --percent or --file")
+    errors = {}
+    if percent is not None:
+        updated, unknown = change_prices(supplier_id, percent), []
+    else:
+        prices = []
+        for position, row in enumerate(csv.DictReader(price_list)):
+            try:
+                prices.append(parse_price((row.get('code') or '').strip(),
+                                          row.get('cost') or ''))
+            except ValueError as e:
+                errors[position] = str(e)
+        updated, unknown = load_price_list(supplier_id, prices)
+    db.session.commit()
+    for position, error in sorted(errors.items()):
+        click.echo("record {}: {}".format(position + 1, error), err=True)
+    for code in unknown:
+        click.echo("unknown code: {}".format(code), err=True)
+    click.echo("{} prices updated, {} unknown codes, {} rejected".format(
+        updated, len(unknown), len(errors)))
+
+
+COMMANDS = (initdb, dropdb, import_suppliers, export_documents,
+            reindex_products, expire_documents, rebuild_on_order,
+            update_prices)
+
+
+def create_app(script_info=None):
+    """Application factory used by ``flask`` and `cli`."""
+    from nas import application
+
+    # commands defined here don't need the REST blueprints. ``flask`` loads
+    # the app to look up commands registered on it, that is from its group
+    # (before the command is known), while its own ones needing the app,
+    # like ``run`` or ``routes``, load it from the command
+    ctx = click.get_current_context(silent=True)
+    cli_only = ctx is not None and (
+        isinstance(ctx.command, click.MultiCommand) or
+        ctx.command in COMMANDS)
+    app = application.create_app(with_api=not cli_only)
+    for command in COMMANDS:
+        app.cli.add_command(command)
+    return app
+
+
+cli = FlaskGroup(create_app=create_app)
+for command in COMMANDS:
+    cli.add_command(command)
+
+
+if __name__ == '__main__':
+    cli()
@@ -1,15 +1,93 @@
 # -*- coding: utf-8 -*-
 
+import os
 from os import path, pardir
 
 basedir = path.abspath(path.join(path.dirname(__file__), pardir))
 
 
+def _env(name, default, cast=str):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    if cast is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
+
+
+#: SQLAlchemy drivers connecting through libpq
+LIBPQ_DRIVERS = ('psycopg2', 'psycopg2cffi')
+
+
+def engine_options(database_url):
+    """
+    Builds `SQLALCHEMY_ENGINE_OPTIONS` for `database_url` from the
+    environment, `create_app` calls it for configs setting
+    `ENGINE_OPTIONS_FROM_ENV`.
+
+    Pools are per process: a server running N workers may open up to
+    N * (NAS_DB_POOL_SIZE + NAS_DB_MAX_OVERFLOW) connections. With
+    NAS_DB_PGBOUNCER set connections aren't pooled in the application (the
+    bouncer does it) and the statement timeout, which PgBouncer doesn't
+    accept as a startup parameter, must be set on the database role instead.
+    """
+    from sqlalchemy.engine.url import make_url
+    from sqlalchemy.pool import NullPool
+    from nas.utils.metrics import InstrumentedQueuePool
+
+    if _env('NAS_DB_PGBOUNCER', False, bool):
+        return {'poolclass': NullPool}
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': _env('NAS_DB_POOL_SIZE', 5, int),
+        'max_overflow': _env('NAS_DB_MAX_OVERFLOW', 10, int),
+        'pool_timeout': _env('NAS_DB_POOL_TIMEOUT', 10, int),
+        'pool_recycle': _env('NAS_DB_POOL_RECYCLE', 1800, int),
+        'pool_pre_ping': _env('NAS_DB_PRE_PING', True, bool),
+    }
+    timeout = _env('NAS_DB_STATEMENT_TIMEOUT', 30000, int)  # milliseconds
+    # libpq startup option, other drivers (and databases) would reject it
+    if timeout and make_url(database_url).get_driver_name() in LIBPQ_DRIVERS:
+        options['connect_args'] = {
+            'options': '-c statement_timeout={:d}'.format(timeout),
+        }
+    return options
+
+
+def settings_from_env(config):
+    """
+    Returns the values of the `ENV_SETTINGS` of `config` (a mapping of
+    setting names to environment variable names and types) found in the
+    environment. `create_app` applies them, so the environment is read when
+    the app is created rather than when this module is imported.
+    """
+    settings = {}
+    for key, (name, cast) in (config.get('ENV_SETTINGS') or {}).items():
+        settings[key] = _env(name, config.get(key), cast)
+    return settings
+
+
 class Config(object):
     DEBUG = False
     TESTING = False
     SECRET_KEY = '<must be secret>'  # use os.random(24) to generate this
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    PAGINATION_COUNT_TTL = None  # seconds to cache list totals, None disables
+    PAGINATION_COUNT_CACHE_SIZE = 1024  # list totals kept per process
+    RESPONSE_CACHE_TYPE = 'lru'  # 'lru', 'filesystem', 'auto' or None
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 300
+    RESPONSE_CACHE_DIR = None  # required by 'filesystem', created 0700
+    METRICS_ENABLED = False  # Server-Timing headers and /api/_metrics
+    ENGINE_OPTIONS_FROM_ENV = False  # see engine_options()
+    AGING_CACHE = True  # reuse aging reports, needs RESPONSE_CACHE_TYPE
+    LOCALE = ''  # process locale, '' uses the environment (LANG, LC_ALL)
+    COMPRESS_ENABLED = True  # gzip/brotli responses as per Accept-Encoding
+    COMPRESS_MIN_SIZE = 1024  # bytes, smaller bodies are sent as they are
+    COMPRESS_LEVELS = {'br': 5, 'gzip': 6}  # routes may override them
+    COMPRESS_CACHE_SIZE = 256  # compressed bodies kept, by ETag and encoding
+    JSON_BACKEND = 'auto'  # 'orjson', 'stdlib', 'auto' or a dumps import path
 
 
 class DevelopmentConfig(Config):
@@ -20,3 +98,24 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+class ProductionConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'postgresql:///nas'
+    ENGINE_OPTIONS_FROM_ENV = True
+    PAGINATION_COUNT_TTL = 30
+    # with a private RESPONSE_CACHE_DIR the cache is shared by every worker
+    # and CLI command of the host, the 'lru' cache is per process (a commit
+    # only invalidates the entries of its own process)
+    RESPONSE_CACHE_TYPE = 'auto'  # 'filesystem' when RESPONSE_CACHE_DIR is set
+    # /api/_metrics isn't authenticated, expose it only on private networks
+    METRICS_ENABLED = False
+    #: settings overridden by environment variables, see settings_from_env()
+    ENV_SETTINGS = {
+        'SECRET_KEY': ('NAS_SECRET_KEY', str),
+        'SQLALCHEMY_DATABASE_URI': ('NAS_DATABASE_URL', str),
+        'PAGINATION_COUNT_TTL': ('NAS_PAGINATION_COUNT_TTL', int),
+        'RESPONSE_CACHE_DIR': ('NAS_RESPONSE_CACHE_DIR', str),
+        'RESPONSE_CACHE_TYPE': ('NAS_RESPONSE_CACHE_TYPE', str),
+        'METRICS_ENABLED': ('NAS_METRICS_ENABLED', bool),
+    }
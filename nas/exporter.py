@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.exporter
+    ~~~~~~~~~~~~
+
+    Streaming export of supplier documents with their payments and balances.
+
+    Rows are read through a server-side cursor (on backends supporting it) in
+    fixed size batches and written out as they arrive, so memory use doesn't
+    depend on the number of exported documents.
+
+    :copyright: (c) 2017 by Augusto Roccasalva
+    :license: MIT, see LICENSE for more details.
+"""
+
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from nas.models import db, Entity, Document, Payment, DocumentPayment
+
+
+BATCH_SIZE = 1000
+
+DOCUMENT_FIELDS = ('id', 'supplier_id', 'supplier', 'doc_type', 'point_sale',
+                   'number', 'doc_status', 'issue_date', 'expiration_date',
+                   'total', 'paid', 'balance')
+PAYMENT_FIELDS = ('payment_id', 'payment_date', 'payment_amount')
+
+
+def _statement(date_from=None, date_to=None, suppliers=None):
+    d = Document.__table__
+    e = Entity.__table__
+    p = Payment.__table__
+    dp = DocumentPayment.__table__
+
+    stmt = select([
+        d.c.id, d.c.supplier_id, e.c.name_1.label('supplier'), d.c.doc_type,
+        d.c.point_sale, d.c.number, d.c.doc_status, d.c.issue_date,
+        d.c.expiration_date, d.c.total, p.c.id.label('payment_id'),
+        p.c.date.label('payment_date'), dp.c.amount.label('payment_amount'),
+    ]).select_from(
+        d.join(e, e.c.id == d.c.supplier_id)
+         .outerjoin(dp, dp.c.document_id == d.c.id)
+         .outerjoin(p, p.c.id == dp.c.payment_id)
+    ).order_by(d.c.id, p.c.date, p.c.id)
+
+    if date_from is not None:
+        stmt = stmt.where(d.c.issue_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(d.c.issue_date <= date_to)
+    if suppliers:
+        stmt = stmt.where(d.c.supplier_id.in_(suppliers))
+    return stmt
+
+
+def _finish(document):
+    paid = sum([p['payment_amount'] for p in document['payments']], Decimal(0))
+    document['paid'] = paid
+    document['balance'] = document['total'] - paid
+    return document
+
+
+def iter_documents(date_from=None, date_to=None, suppliers=None,
+                   batch_size=BATCH_SIZE, connection=None):
+    """
+    Yields a dict for each document issued between `date_from` and `date_to`
+    (inclusive, both optional) of the given `suppliers` ids (all by default),
+    with its list of `payments` and computed `paid` and `balance`.
+    """
+    if connection is None:
+        connection = db.session.connection()
+    result = connection.execution_options(stream_results=True)\
+                       .execute(_statement(date_from, date_to, suppliers))
+    current = None
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                if current is None or current['id'] != row.id:
+                    if current is not None:
+                        yield _finish(current)
+                    current = dict((f, row[f]) for f in DOCUMENT_FIELDS[:-2])
+                    current['payments'] = []
+                if row.payment_id is not None:
+                    current['payments'].append(
+                        dict((f, row[f]) for f in PAYMENT_FIELDS))
+    finally:
+        result.close()
+    if current is not None:
+        yield _finish(current)
+
+
+def _amount(value):
+    # every decimal is an amount, zero included it gets two decimals
+    return '{:.2f}'.format(value)
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return _amount(value)
+    raise TypeError(repr(value))
+
+
+def _csv_value(value):
+    return _amount(value) if isinstance(value, Decimal) else value
+
+
+def iter_ndjson(documents):
+    """Yields one JSON line for each document."""
+    for document in documents:
+        yield json.dumps(document, default=_default) + '\n'
+
+
+def iter_csv(documents, lines=BATCH_SIZE):
+    """
+    Yields CSV text for `documents`, `lines` rows at a time. There is one row
+    per document payment (document columns repeated), or a single row with
+    empty payment columns for documents without payments.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(DOCUMENT_FIELDS + PAYMENT_FIELDS)
+    count = 0
+    for document in documents:
+        head = [_csv_value(document[f]) for f in DOCUMENT_FIELDS]
+        for payment in document['payments'] or [{}]:
+            writer.writerow(head + [_csv_value(payment.get(f))
+                                    for f in PAYMENT_FIELDS])
+            count += 1
+        if count >= lines:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            count = 0
+    yield buf.getvalue()
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
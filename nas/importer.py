@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.importer
+    ~~~~~~~~~~~~
+
+    Bulk import of suppliers with their fiscal data, addresses, phones,
+    emails and contacts.
+
+    Records are read lazily from CSV or NDJSON and inserted in chunks with
+    Core executemany (or ``COPY`` on PostgreSQL), bypassing the unit of work.
+    Primary keys are allocated up front from the current maximum of each
+    table, so the import must not run concurrently with other writers of
+    those tables.
+
+    NDJSON records are nested::
+
+        {"rz": "ACME SA", "cuit": "30500010912", "fiscal_type": "EXCENTO",
+         "address": [{"street": "San Martin", "province": "Mendoza"}],
+         "phone": [{"number": "261 4000000", "phone_type": "Oficina"}],
+         "email": [{"email": "ventas@acme.com"}],
+         "contacts": [{"first_name": "Juan", "last_name": "Perez",
+                       "role": "Ventas"}]}
+
+    CSV rows are flat and hold at most one address, phone, email and contact,
+    using prefixed columns (`address_street`, `phone_number`, `email`,
+    `contact_first_name`, `contact_role`, ...).
+
+    :copyright: (c) 2017 by Augusto Roccasalva
+    :license: MIT, see LICENSE for more details.
+"""
+
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from nas.models import (db, IN_CHUNK_SIZE, Entity, Supplier, SupplierContact,
+                        Contact, FiscalData, Address, Phone, Email)
+from nas.utils.cache import mark_changed
+from nas.utils.validators import validate_cuits
+
+
+SUPPLIER_FIELDS = ('web', 'sup_type', 'payment_term', 'leap_time',
+                   'delivery_included')
+FISCAL_FIELDS = ('cuit', 'fiscal_type', 'iibb')
+CHILDREN = {
+    'address': (Address, ('street', 'streetnumber', 'city', 'province',
+                          'zip_code', 'address_type')),
+    'phone': (Phone, ('phone_type', 'number')),
+    'email': (Email, ('email_type', 'email')),
+}
+CHILDREN_REQUIRED = {
+    'address': ('street', 'province'),
+    'phone': ('number',),
+    'email': ('email',),
+}
+CONTACT_FIELDS = ('first_name', 'last_name', 'role')
+
+# CSV column prefix for each nested collection
+_CSV_PREFIXES = {
+    'address': 'address_',
+    'phone': 'phone_',
+    'email': 'email_',
+    'contacts': 'contact_',
+}
+_CSV_ALIASES = {
+    ('address', 'address_type'): 'address_type',
+    ('phone', 'number'): 'phone_number',
+    ('phone', 'phone_type'): 'phone_type',
+    ('email', 'email'): 'email',
+    ('email', 'email_type'): 'email_type',
+}
+
+
+def _clean(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _csv_record(row):
+    row = dict((k, _clean(v)) for k, v in row.items())
+    record = dict(row)
+    for key, prefix in _CSV_PREFIXES.items():
+        fields = CONTACT_FIELDS if key == 'contacts' else CHILDREN[key][1]
+        child = {}
+        for field in fields:
+            column = _CSV_ALIASES.get((key, field), prefix + field)
+            if row.get(column) is not None:
+                child[field] = row[column]
+        record[key] = [child] if child else []
+    return record
+
+
+def read_csv(fp):
+    for row in csv.DictReader(fp):
+        yield _csv_record(row)
+
+
+def read_ndjson(fp):
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 't', 'yes', 'y', 'si', 's')
+    return bool(value)
+
+
+class SupplierImporter(object):
+    """Imports supplier records in chunks, see `import_records`."""
+
+    tables = (Entity.__table__, Supplier.__table__, Contact.__table__,
+              FiscalData.__table__, Address.__table__, Phone.__table__,
+              Email.__table__, SupplierContact.__table__)
+
+    def __init__(self, session, chunk_size=1000, use_copy=None):
+        self.session = session
+        self.chunk_size = chunk_size
+        dialect = session.get_bind().dialect.name
+        self.use_copy = dialect == 'postgresql' if use_copy is None else use_copy
+        self._next_id = {}
+        self._cuits = set()  # normalized CUITs imported so far
+
+    def _allocate(self, model, n):
+        table = model.__table__
+        if table.name not in self._next_id:
+            pk = table.primary_key.columns.values()[0]
+            current = self.session.query(db.func.max(pk)).scalar() or 0
+            self._next_id[table.name] = current + 1
+        start = self._next_id[table.name]
+        self._next_id[table.name] = start + n
+        return range(start, start + n)
+
+    def _validate(self, records, offset):
+        """Returns valid records and a dict of errors by record position."""
+        errors = {}
+        for i, record in enumerate(records):
+            if not _clean(record.get('rz')):
+                errors[offset + i] = "'rz' field must be present"
+            elif (_clean(record.get('sup_type')) or Supplier.TYPE_PRODUCTS) \
+                    not in Supplier._sup_type:
+                errors[offset + i] = 'Invalid sup_type'
+            elif self._fiscal(record).get('fiscal_type') \
+                    not in FiscalData._fiscal_types:
+                errors[offset + i] = 'Invalid fiscal_type'
+            else:
+                for key, required in CHILDREN_REQUIRED.items():
+                    for child in record.get(key) or []:
+                        missing = [f for f in required if not _clean(child.get(f))]
+                        if missing:
+                            errors[offset + i] = "'{}' field of {} must be " \
+                                                 "present".format(missing[0], key)
+
+        with_cuit = [i for i, r in enumerate(records)
+                     if self._fiscal(r).get('cuit') is not None]
+        mask, cuits = validate_cuits([self._fiscal(records[i])['cuit']
+                                      for i in with_cuit])
+        existing = self._existing_cuits(
+            [c for c, valid in zip(cuits, mask) if valid])
+        for i, valid, cuit in zip(with_cuit, mask, cuits):
+            if not valid:
+                errors.setdefault(offset + i, 'CUIT invalid')
+            elif cuit in existing or cuit in self._cuits:
+                errors.setdefault(offset + i, 'Duplicate CUIT')
+            elif offset + i not in errors:
+                self._cuits.add(cuit)
+        return [r for i, r in enumerate(records) if offset + i not in errors], errors
+
+    def _existing_cuits(self, cuits):
+        """Those of the normalized `cuits` already in the database."""
+        fd = FiscalData.__table__
+        normalized = db.func.replace(fd.c.cuit, '-', '')
+        cuits = sorted(set(cuits))
+        existing = set()
+        for n in range(0, len(cuits), IN_CHUNK_SIZE):
+            existing.update(row[0] for row in self.session.execute(
+                db.select([normalized]).where(
+                    normalized.in_(cuits[n:n+IN_CHUNK_SIZE]))))
+        return existing
+
+    def _fiscal(self, record):
+        fiscal = record.get('fiscal_data') or {}
+        fiscal = dict((f, _clean(fiscal.get(f, record.get(f))))
+                      for f in FISCAL_FIELDS)
+        if fiscal['fiscal_type'] is None:
+            fiscal['fiscal_type'] = FiscalData.FISCAL_CONSUMIDOR_FINAL
+        return fiscal
+
+    def _rows(self, records):
+        now = datetime.now()
+        rows = dict((t.name, []) for t in self.tables)
+
+        supplier_ids = self._allocate(Entity, len(records))
+        fiscal_ids = self._allocate(FiscalData, len(records))
+        for record, supplier_id, fiscal_id in zip(records, supplier_ids,
+                                                  fiscal_ids):
+            rows['entity'].append({
+                'id': supplier_id, 'name_1': _clean(record['rz']),
+                'name_2': _clean(record.get('name')),
+                'entity_type': u'supplier', 'notes': _clean(record.get('notes')),
+                'created': now, 'modified': now,
+            })
+            fiscal = self._fiscal(record)
+            fiscal['id'] = fiscal_id
+            rows['fiscal_data'].append(fiscal)
+
+            supplier = dict((f, _clean(record.get(f))) for f in SUPPLIER_FIELDS)
+            supplier.update({
+                'supplier_id': supplier_id, 'fiscal_data_id': fiscal_id,
+                'sup_type': supplier['sup_type'] or Supplier.TYPE_PRODUCTS,
+                'delivery_included': _as_bool(supplier['delivery_included']),
+                'debt': Decimal(0), 'expired': Decimal(0),
+                'expiration_date': None,
+            })
+            rows['supplier'].append(supplier)
+
+            for key, (model, fields) in CHILDREN.items():
+                children = record.get(key) or []
+                for child, child_id in zip(children,
+                                           self._allocate(model, len(children))):
+                    row = dict((f, _clean(child.get(f))) for f in fields)
+                    row.update({'id': child_id, 'entity_id': supplier_id})
+                    rows[model.__tablename__].append(row)
+
+            contacts = record.get('contacts') or []
+            for contact, contact_id in zip(contacts,
+                                           self._allocate(Entity, len(contacts))):
+                rows['entity'].append({
+                    'id': contact_id,
+                    'name_1': _clean(contact.get('first_name')) or u'',
+                    'name_2': _clean(contact.get('last_name')),
+                    'entity_type': u'contact', 'notes': None,
+                    'created': now, 'modified': now,
+                })
+                rows['contact'].append({'contact_id': contact_id})
+                rows['supplier_contact'].append({
+                    'supplier_id': supplier_id, 'contact_id': contact_id,
+                    'role': _clean(contact.get('role')),
+                })
+        return rows
+
+    def _copy(self, table, rows):
+        columns = list(rows[0].keys())
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([row[c] for c in columns])
+        buf.seek(0)
+        cursor = self.session.connection().connection.cursor()
+        cursor.copy_expert('COPY {} ({}) FROM STDIN WITH CSV'.format(
+            table.name, ', '.join(columns)), buf)
+
+    def _insert(self, rows):
+        for table in self.tables:
+            table_rows = rows[table.name]
+            if not table_rows:
+                continue
+            if self.use_copy:
+                self._copy(table, table_rows)
+            else:
+                self.session.execute(table.insert(), table_rows)
+
+    def _fix_sequences(self):
+        if self.session.get_bind().dialect.name != 'postgresql':
+            return
+        for name in self._next_id:
+            self.session.execute(
+                "SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                "(SELECT max(id) FROM {0}))".format(name))
+
+    def import_records(self, records, progress=None):
+        """
+        Imports `records` (an iterable of dicts), committing each chunk.
+
+        `progress`, when given, is called after each chunk with the number of
+        imported records so far and the elapsed seconds. Invalid records, and
+        those with a CUIT already imported or in the database, are skipped.
+        Returns a tuple with the number of imported records and a dict of
+        errors keyed by record position.
+        """
+        records = iter(records)
+        imported, offset, errors = 0, 0, {}
+        start = time.time()
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            valid, chunk_errors = self._validate(chunk, offset)
+            errors.update(chunk_errors)
+            offset += len(chunk)
+            if valid:
+                self._insert(self._rows(valid))
+                self._fix_sequences()
+                mark_changed(self.session, *(t.name for t in self.tables))
+                self.session.commit()
+                imported += len(valid)
+            if progress is not None:
+                progress(imported, time.time() - start)
+        return imported, errors
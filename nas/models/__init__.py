@@ -4,6 +4,9 @@ from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+#: maximum number of values sent on a single ``IN (...)`` clause
+IN_CHUNK_SIZE = 500
+
 
 def configure_db(app):
     db.init_app(app)
@@ -14,8 +17,12 @@ from .misc import Address, Phone, Email
 from .fiscal import FiscalData
 from .contact import Contact
 from .supplier import Supplier, SupplierContact
-from .product import Product, ProductSupplierInfo
+from .product import Product, ProductSupplierInfo, ProductPriceHistory
 from .document import Document
 from .payment import Payment, DocumentPayment
 from .bank import Bank, BankAccount
-from .order import PurchaseOrder, PurchaseOrderItem
+from .order import PurchaseOrder, PurchaseOrderItem, ProductOnOrder
+from .allocation import allocate_payment
+from .expiration import expire_documents
+from .receiving import receive_items
+from .pricing import change_prices, load_price_list
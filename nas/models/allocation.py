@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select, exists, bindparam
+
+from . import db, IN_CHUNK_SIZE
+from .document import Document
+from .payment import DocumentPayment
+from .supplier import Supplier, refresh_expiration_dates
+from ..utils.cache import mark_changed
+
+
+def _open_documents(payment, supplier=None, ids=None):
+    d = Document.__table__
+    dp = DocumentPayment.__table__
+
+    paid = select([dp.c.document_id, db.func.sum(dp.c.amount).label('paid')])\
+            .group_by(dp.c.document_id)
+    stmt = select([d.c.id, d.c.supplier_id, d.c.total, d.c.doc_status,
+                   d.c.expiration_date, d.c.issue_date])\
+            .where(d.c.doc_status.in_([Document.STATUS_PENDING,
+                                       Document.STATUS_EXPIRED]))\
+            .where(~exists().where(dp.c.document_id == d.c.id)
+                            .where(dp.c.payment_id == payment.id))
+    if supplier is not None:
+        stmt = stmt.where(d.c.supplier_id == supplier.supplier_id)
+        paid = paid.where(dp.c.document_id.in_(
+            select([d.c.id]).where(d.c.supplier_id == supplier.supplier_id)))
+    else:
+        stmt = stmt.where(d.c.id.in_(ids))
+        paid = paid.where(dp.c.document_id.in_(ids))
+
+    paid = paid.alias('paid')
+    return stmt.column(db.func.coalesce(paid.c.paid, 0).label('paid'))\
+               .select_from(d.outerjoin(paid, paid.c.document_id == d.c.id))\
+               .order_by(d.c.expiration_date.is_(None), d.c.expiration_date,
+                         d.c.issue_date.is_(None), d.c.issue_date, d.c.id)
+
+
+def _allocation_order(row):
+    # same order as _open_documents(), NULL dates last on every backend
+    return (row.expiration_date is None, row.expiration_date or date.min,
+            row.issue_date is None, row.issue_date or date.min, row.id)
+
+
+def _open_document_rows(session, payment, supplier=None, documents=None):
+    """
+    Open documents in allocation order, the given `documents` are queried by
+    chunks of ids and sorted here.
+    """
+    if supplier is not None:
+        return session.execute(_open_documents(payment, supplier=supplier))
+    ids = sorted(set(doc.id for doc in documents))
+    rows = []
+    for i in range(0, len(ids), IN_CHUNK_SIZE):
+        rows.extend(session.execute(
+            _open_documents(payment, ids=ids[i:i+IN_CHUNK_SIZE])))
+    rows.sort(key=_allocation_order)
+    return rows
+
+
+def allocate_payment(payment, supplier=None, documents=None):
+    """
+    Allocates `payment.amount` among the open documents of `supplier`, or
+    among the given `documents`, paying first the ones expiring (then issued)
+    earlier.
+
+    Open balances are fetched with one query, the `DocumentPayment` rows are
+    bulk inserted, fully paid documents are marked as paid with one UPDATE
+    and supplier debt, expired amount and expiration date are adjusted with
+    set based statements, without going through the ORM listeners. Affected
+    instances present in the session are expired.
+
+    Returns a list of `(document_id, amount)` tuples; any amount left is
+    simply not allocated.
+    """
+    if (supplier is None) == (documents is None):
+        raise ValueError("Either 'supplier' or 'documents' must be given")
+    session = db.object_session(payment) or db.session
+    session.add(payment)
+    session.flush()
+
+    remaining = payment.amount
+    allocations = []
+    paid_documents = []
+    for row in _open_document_rows(session, payment, supplier, documents):
+        if remaining <= 0:
+            break
+        balance = row.total - Decimal(row.paid)
+        if balance <= 0:
+            continue
+        amount = min(balance, remaining)
+        allocations.append((row.id, amount))
+        remaining -= amount
+        if amount == balance:
+            paid_documents.append(row)
+
+    if not allocations:
+        return allocations
+
+    session.execute(DocumentPayment.__table__.insert(), [
+        {'document_id': doc_id, 'payment_id': payment.id, 'amount': amount}
+        for doc_id, amount in allocations])
+
+    suppliers = set()
+    if paid_documents:
+        d = Document.__table__
+        ids = [row.id for row in paid_documents]
+        for i in range(0, len(ids), IN_CHUNK_SIZE):
+            chunk = ids[i:i+IN_CHUNK_SIZE]
+            session.execute(d.update().where(d.c.id.in_(chunk))
+                                      .values(doc_status=Document.STATUS_PAID))
+
+        debt, expired = defaultdict(Decimal), defaultdict(Decimal)
+        for row in paid_documents:
+            debt[row.supplier_id] += row.total
+            if row.doc_status == Document.STATUS_EXPIRED:
+                expired[row.supplier_id] += row.total
+        s = Supplier.__table__
+        session.execute(
+            s.update()
+             .where(s.c.supplier_id == bindparam('sid'))
+             .values(debt=s.c.debt - bindparam('debt_delta'),
+                     expired=s.c.expired - bindparam('expired_delta')),
+            [{'sid': sid, 'debt_delta': debt[sid],
+              'expired_delta': expired[sid]} for sid in debt])
+        suppliers.update(debt)
+        refresh_expiration_dates(session, suppliers)
+
+    mark_changed(session, 'document', 'document_payment', 'supplier')
+
+    documents_ids = set(doc_id for doc_id, _ in allocations)
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Document) and obj.id in documents_ids or \
+           isinstance(obj, Supplier) and obj.supplier_id in suppliers:
+            session.expire(obj)
+    session.expire(payment, ['document_payments'])
+    return allocations
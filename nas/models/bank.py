@@ -2,8 +2,9 @@
 
 from sqlalchemy.orm import validates
 
-from . import db
-from ..utils.validators import validate_cuit, validate_cbu
+from . import db, IN_CHUNK_SIZE
+from ..utils.cache import mark_changed
+from ..utils.validators import validate_cuit, validate_cuits, validate_cbu
 
 class Bank(db.Model):
     __tablename__ = 'bank'
@@ -37,6 +38,66 @@ class Bank(db.Model):
             raise ValueError("'bcra_code' must be unique")
         return bcra_code
 
+    @classmethod
+    def bulk_create(cls, rows):
+        """
+        Validates and inserts many banks at once.
+
+        `rows` is a list of dicts with bank properties. Uniqueness is checked
+        with one ``IN (...)`` query per unique column (instead of one query
+        per attribute and row) and valid rows are inserted with a single
+        executemany, skipping the per-attribute validators.
+
+        Returns a tuple with the number of inserted rows and a dict mapping
+        the index of each rejected row to its errors.
+        """
+        errors = {}
+        fields = ('name', 'bcra_code', 'cuit')
+        rows = [dict((f, row.get(f)) for f in fields) for row in rows]
+
+        for idx, row in enumerate(rows):
+            if not row['name']:
+                errors.setdefault(idx, {})['name'] = "'name' field must be present"
+
+        with_cuit = [idx for idx, row in enumerate(rows) if row['cuit'] is not None]
+        valid_cuits, _ = validate_cuits([rows[idx]['cuit'] for idx in with_cuit])
+        for idx, valid in zip(with_cuit, valid_cuits):
+            if not valid:
+                errors.setdefault(idx, {})['cuit'] = 'CUIT Invalid'
+
+        messages = {
+            'name': "Name must be unique",
+            'bcra_code': "'bcra_code' must be unique",
+            'cuit': 'CUIT must be unique',
+        }
+        for field in fields:
+            column = getattr(cls, field)
+            seen = set()
+            for idx, row in enumerate(rows):
+                value = row[field]
+                if value is None:
+                    continue
+                if value in seen:
+                    errors.setdefault(idx, {}).setdefault(field, messages[field])
+                seen.add(value)
+
+            values = list(seen)
+            existing = set()
+            for i in range(0, len(values), IN_CHUNK_SIZE):
+                chunk = values[i:i+IN_CHUNK_SIZE]
+                existing.update(v for v, in db.session.query(column)
+                                                     .filter(column.in_(chunk)))
+            for idx, row in enumerate(rows):
+                if row[field] in existing:
+                    errors.setdefault(idx, {}).setdefault(field, messages[field])
+
+        valid = [row for idx, row in enumerate(rows) if idx not in errors]
+        if valid:
+            db.session.execute(cls.__table__.insert(), valid)
+            mark_changed(db.session, cls.__tablename__)
+        return len(valid), errors
+
+
 class BankAccount(db.Model):
     __tablename__ = 'bank_account'
 
@@ -52,7 +113,7 @@ class BankAccount(db.Model):
     bank = db.relationship(Bank, backref='accounts')
 
     entity_id = db.Column(db.Integer, db.ForeignKey('entity.id'), nullable=False)
-    entity = db.relationship('Entity', backref='bank_accounts', lazy='joined')
+    entity = db.relationship('Entity', backref='bank_accounts')
 
     @validates('cbu')
     def cbu_is_valid(self, key, cbu):
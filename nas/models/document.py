@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from decimal import Decimal
-from . import db
+from sqlalchemy.orm.attributes import NO_VALUE, NEVER_SET
+
+from . import db, IN_CHUNK_SIZE
 from .payment import DocumentPayment
 from .misc import TimestampMixin
 
@@ -39,7 +41,7 @@ class Document(db.Model, TimestampMixin):
                            default=STATUS_PENDING)
     issue_date = db.Column(db.Date)
     expiration_date = db.Column(db.Date)
-    notes = db.Column(db.UnicodeText)
+    notes = db.deferred(db.Column(db.UnicodeText))
 
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.supplier_id'),
                             nullable=False)
@@ -53,6 +55,31 @@ class Document(db.Model, TimestampMixin):
         if amount is None:
             amount = min([payment.amount, self.balance])
         self.document_payments.append(DocumentPayment(payment, amount))
+        if '_paid' in self.__dict__:
+            self._paid += amount
+
+    @classmethod
+    def load_balances(cls, documents):
+        """
+        Loads the paid amount of all `documents` with one grouped query.
+
+        Afterwards `paid` and `balance` of those documents are answered without
+        querying the database, until they are expired (e.g. on commit).
+        Returns the documents as a list.
+        """
+        documents = list(documents)
+        ids = [d.id for d in documents if d.id is not None]
+        paid = {}
+        for i in range(0, len(ids), IN_CHUNK_SIZE):
+            paid.update(db.session.query(DocumentPayment.document_id,
+                                         db.func.sum(DocumentPayment.amount))
+                          .filter(DocumentPayment.document_id.in_(
+                              ids[i:i+IN_CHUNK_SIZE]))
+                          .group_by(DocumentPayment.document_id))
+        for document in documents:
+            if document.id is not None:
+                document._paid = paid.get(document.id) or Decimal(0)
+        return documents
 
     @property
     def type(self):
@@ -78,72 +105,106 @@ class Document(db.Model, TimestampMixin):
                             .filter(DocumentPayment.document==self)\
                             .order_by(Payment.date.desc())[0].date
 
+    @property
+    def paid(self):
+        paid = self.__dict__.get('_paid')
+        if paid is None:
+            paid = db.session.query(db.func.sum(DocumentPayment.amount))\
+                             .filter(DocumentPayment.document==self).scalar()\
+                             or Decimal(0)
+        return paid
+
     @property
     def balance(self):
-        paid = db.session.query(db.func.sum(DocumentPayment.amount))\
-                         .filter(DocumentPayment.document==self).scalar()\
-                         or Decimal(0)
-        return self.total - paid
+        return self.total - self.paid
 
     def __repr__(self):
         return "<Document '{} {}' of '{}' ({})>".format(
                 self.type, self.full_number, self.supplier.rz, self.status)
 
 
+@db.event.listens_for(Document, "expire")
+def expire_paid(target, attrs):
+    # drop the amount preloaded by Document.load_balances()
+    target.__dict__.pop('_paid', None)
+
+
+@db.event.listens_for(Document, "refresh")
+def refresh_paid(target, context, attrs):
+    target.__dict__.pop('_paid', None)
+
+
+_OPEN_STATUS = (Document.STATUS_PENDING, Document.STATUS_EXPIRED, None)
+
+
+def _value(value):
+    # attribute events receive these symbols when there is no previous value
+    return None if value in (NO_VALUE, NEVER_SET) else value
+
+
 @db.event.listens_for(Document.supplier, "set", active_history=True)
 def set_supplier(target, value, oldvalue, initiator):
     # target: Document
     # value: Supplier
-    if target.doc_status in ('STATUS_PENDING', None):
-        value.debt += target.total
-        value._update_expiration_date()
-        if oldvalue:
-            oldvalue.debt -= target.total
-            oldvalue._update_expiration_date()
-    elif target.doc_status is 'STATUS_EXPIRED':
-        value.debt += target.total
-        value.expired += target.total
-        value._update_expiration_date()
-        if oldvalue:
-            oldvalue.debt -= target.total
-            oldvalue.expired -= targe.total
-            oldvalue._update_expiration_date()
+    oldvalue = _value(oldvalue)
+    if value is oldvalue or target.doc_status not in _OPEN_STATUS:
+        return
+    total = target.total or 0
+    expired = target.doc_status == Document.STATUS_EXPIRED
+    if value is not None:
+        value.debt += total
+        if expired:
+            value.expired += total
+        value._expiration_added(target.expiration_date)
+    if oldvalue is not None:
+        oldvalue.debt -= total
+        if expired:
+            oldvalue.expired -= total
+        oldvalue._expiration_removed(target.expiration_date)
 
 
 @db.event.listens_for(Document.doc_status, "set", active_history=True)
 def set_doc_status(target, value, oldvalue, initiator):
     # target: Document
     # value: doc_status
-    if target.supplier:
-        if oldvalue == 'STATUS_EXPIRED':
-            if value == 'STATUS_PAID':
-                target.supplier.expired -= target.total
-                target.supplier.debt -= target.total
-                target.supplier._update_expiration_date()
-            elif value == 'STATUS_PENDING':
-                target.supplier.expired -= target.total
-        elif oldvalue == 'STATUS_PENDING':
-            if value == 'STATUS_PAID':
-                target.supplier.debt -= target.total
-                _update_expiration_date(target.supplier)
-            elif value == 'STATUS_EXPIRED':
-                target.supplier.expired += target.total
-        elif oldvalue == 'STATUS_PAID':
-            if value == 'STATUS_PENDING':
-                target.supplier.debt += target.total
-                target.supplier._update_expiration_date()
-            elif value == 'STATUS_EXPIRED':
-                target.supplier.debt += target.total
-                target.supplier.expired += target.total
-                target.supplier._update_expiration_date()
+    oldvalue = _value(oldvalue)
+    supplier = target.supplier
+    if supplier is None or value == oldvalue:
+        return
+    total = target.total or 0
+    if oldvalue == Document.STATUS_EXPIRED:
+        supplier.expired -= total
+    if value == Document.STATUS_EXPIRED:
+        supplier.expired += total
+
+    was_open, is_open = oldvalue in _OPEN_STATUS, value in _OPEN_STATUS
+    if was_open and not is_open:
+        supplier.debt -= total
+        supplier._expiration_removed(target.expiration_date)
+    elif is_open and not was_open:
+        supplier.debt += total
+        supplier._expiration_added(target.expiration_date)
+
 
 @db.event.listens_for(Document.total, "set", active_history=True)
 def set_total(target, value, oldvalue, initiator):
     # target: Document
     # value: total
-    if target.supplier:
-        if target.doc_status in ('STATUS_PENDING', None):
-            target.supplier.debt += (value - oldvalue)
-        if target.doc_status is 'STATUS_EXPIRED':
-            target.supplier.debt += (value - oldvalue)
-            target.supplier.expired += (value - oldvalue)
+    supplier = target.supplier
+    if supplier is None or target.doc_status not in _OPEN_STATUS:
+        return
+    delta = (value or 0) - (_value(oldvalue) or 0)
+    supplier.debt += delta
+    if target.doc_status == Document.STATUS_EXPIRED:
+        supplier.expired += delta
+
+
+@db.event.listens_for(Document.expiration_date, "set", active_history=True)
+def set_expiration_date(target, value, oldvalue, initiator):
+    # target: Document
+    # value: expiration_date
+    supplier = target.supplier
+    if supplier is None or target.doc_status not in _OPEN_STATUS:
+        return
+    supplier._expiration_added(value)
+    supplier._expiration_removed(_value(oldvalue))
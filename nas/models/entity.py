@@ -18,7 +18,7 @@ class Entity(db.Model, TimestampMixin):
     _name_1 = db.Column('name_1', db.Unicode, nullable=False)
     _name_2 = db.Column('name_2', db.Unicode)
     entity_type = db.Column(db.Unicode(50))
-    notes = db.Column(db.UnicodeText)
+    notes = db.deferred(db.Column(db.UnicodeText))
     __mapper_args__ = {'polymorphic_on': entity_type}
 
     @property
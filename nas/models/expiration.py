@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from sqlalchemy import select, case
+
+from . import db
+from .document import Document
+from .supplier import Supplier
+from ..utils.cache import mark_changed
+
+
+_OPEN = (Document.STATUS_PENDING, Document.STATUS_EXPIRED)
+
+
+def _expired_suppliers(d, as_of):
+    # every supplier owning a document expired before as_of, a superset of
+    # the ones just swept (recomputing the others is harmless)
+    return select([d.c.supplier_id])\
+        .where(d.c.doc_status == Document.STATUS_EXPIRED)\
+        .where(d.c.expiration_date < as_of)\
+        .distinct()
+
+
+def expire_documents(as_of=None, session=None):
+    """
+    Marks as expired every pending document whose expiration date is before
+    `as_of` (today by default) and recomputes the expired amount of their
+    suppliers.
+
+    Runs a constant number of statements whatever the number of documents:
+    one UPDATE for the documents and one for the suppliers (an
+    ``UPDATE ... FROM`` a grouped subquery on PostgreSQL, a correlated
+    subquery elsewhere), without going through the ORM listeners. Returns
+    the number of expired documents.
+    """
+    as_of = as_of or date.today()
+    session = session or db.session
+    session.flush()
+    d = Document.__table__
+    s = Supplier.__table__
+
+    expired = session.execute(
+        d.update().where(d.c.doc_status == Document.STATUS_PENDING)
+                  .where(d.c.expiration_date < as_of)
+                  .values(doc_status=Document.STATUS_EXPIRED)).rowcount
+    if not expired:
+        return 0
+
+    affected = _expired_suppliers(d, as_of)
+    if session.get_bind().dialect.name == 'postgresql':
+        totals = select([
+            d.c.supplier_id,
+            db.func.sum(case([(d.c.doc_status == Document.STATUS_EXPIRED,
+                               d.c.total)], else_=0)).label('expired'),
+            db.func.min(d.c.expiration_date).label('earliest'),
+        ]).where(d.c.doc_status.in_(_OPEN))\
+          .where(d.c.supplier_id.in_(affected))\
+          .group_by(d.c.supplier_id).alias('totals')
+        session.execute(
+            s.update().where(s.c.supplier_id == totals.c.supplier_id)
+                      .values(expired=totals.c.expired,
+                              expiration_date=totals.c.earliest))
+    else:
+        # the earliest expiration date of open documents can't change here,
+        # documents stay open
+        total = select([db.func.coalesce(db.func.sum(d.c.total), 0)])\
+            .where(d.c.supplier_id == s.c.supplier_id)\
+            .where(d.c.doc_status == Document.STATUS_EXPIRED)\
+            .as_scalar()
+        session.execute(s.update().where(s.c.supplier_id.in_(affected))
+                                  .values(expired=total))
+
+    mark_changed(session, 'document', 'supplier')
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, (Document, Supplier)):
+            session.expire(obj)
+    return expired
@@ -31,8 +31,7 @@ class RefEntityMixin(object):
     @declared_attr
     def entity(cls):
         name = cls.__name__.lower()
-        return db.relationship('Entity',
-                               backref=db.backref(name, lazy='joined'))
+        return db.relationship('Entity', backref=name)
 
 
 class Address(RefEntityMixin, db.Model):
@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from . import db
+import hashlib
+from collections import defaultdict
+
+from sqlalchemy import select, case, text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, BIGINT
+from sqlalchemy.orm import Session
+
+from . import db, IN_CHUNK_SIZE
 from .misc import TimestampMixin
+from ..utils.cache import mark_changed
 
 
 class PurchaseOrder(db.Model, TimestampMixin):
@@ -44,15 +52,20 @@ class PurchaseOrder(db.Model, TimestampMixin):
                           default=STATUS_DRAFT)
     po_method = db.Column(db.Enum(*_po_method.keys(), name='po_method'),
                           default=None)
-    notes = db.Column(db.UnicodeText)
+    notes = db.deferred(db.Column(db.UnicodeText))
 
 
     open_date = db.Column(db.Date)
     confirm_date = db.Column(db.Date)
     receival_date = db.Column(db.Date)
 
-    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.supplier_id'), nullable=False)
-    supplier = db.relationship('Supplier', backref="orders")
+    # active_history: ProductOnOrder needs previous values, see
+    # update_on_order()
+    supplier_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('supplier.supplier_id'),
+                  nullable=False), active_history=True)
+    supplier = db.relationship('Supplier', backref="orders",
+                               active_history=True)
 
     @property
     def status(self):
@@ -73,16 +86,179 @@ class PurchaseOrderItem(db.Model):
     __tablename__ = 'purchaseorder_item'
 
     id = db.Column(db.Integer, primary_key=True)
-    sku = db.Column(db.Unicode(40))
+    sku = db.column_property(db.Column(db.Unicode(40)), active_history=True)
     description = db.Column(db.UnicodeText)
     quantity = db.Column(db.Integer, default=0)
     quantity_received = db.Column(db.Integer, default=0)
     quantity_returned = db.Column(db.Integer, default=0)
 
-    order_id = db.Column(db.Integer, db.ForeignKey('purchaseorder.id'),
-                         nullable=False)
-    order = db.relationship('PurchaseOrder', backref='items')
+    order_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('purchaseorder.id'),
+                  nullable=False), active_history=True)
+    order = db.relationship('PurchaseOrder', backref='items',
+                            active_history=True)
 
     @property
     def pending_quantity(self):
         return self.quantity - self.quantity_received
+
+
+class ProductOnOrder(db.Model):
+    """
+    Pending quantity of each supplier `sku` on open (neither cancelled nor
+    completed) purchase orders. Kept up to date on flush and by
+    `receive_items`, see `refresh_on_order`.
+    """
+    __tablename__ = 'product_on_order'
+
+    CLOSED_STATUS = (PurchaseOrder.STATUS_CANCELLED,
+                     PurchaseOrder.STATUS_COMPLETED)
+
+    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.supplier_id'),
+                            primary_key=True)
+    sku = db.Column(db.Unicode(40), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
+
+def _on_order_select(supplier_ids=None, skus=None):
+    i = PurchaseOrderItem.__table__
+    o = PurchaseOrder.__table__
+    pending = db.func.coalesce(i.c.quantity, 0) - \
+              db.func.coalesce(i.c.quantity_received, 0)
+    # over received items don't reduce what other orders still wait for
+    pending = case([(pending > 0, pending)], else_=0)
+    stmt = select([o.c.supplier_id, i.c.sku,
+                   db.func.sum(pending).label('quantity')])\
+        .select_from(i.join(o, o.c.id == i.c.order_id))\
+        .where(i.c.sku.isnot(None))\
+        .where(db.func.coalesce(o.c.po_status, PurchaseOrder.STATUS_DRAFT)
+               .notin_(ProductOnOrder.CLOSED_STATUS))\
+        .group_by(o.c.supplier_id, i.c.sku)\
+        .having(db.func.sum(pending) > 0)
+    if supplier_ids is not None:
+        stmt = stmt.where(o.c.supplier_id.in_(supplier_ids))\
+                   .where(i.c.sku.in_(skus))
+    return stmt
+
+
+_lock_keys = text(
+    "SELECT pg_advisory_xact_lock(k) FROM "
+    "(SELECT unnest(:keys) AS k ORDER BY 1) AS keys"
+).bindparams(bindparam('keys', type_=ARRAY(BIGINT)))
+
+
+def _lock_key(supplier_id, sku):
+    digest = hashlib.md5(u'product_on_order:{}:{}'.format(
+        supplier_id, sku).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def _lock_on_order(session, keys):
+    """
+    Serializes the refresh of `keys` with other transactions on PostgreSQL:
+    with transaction level advisory locks (taken in a fixed order), the
+    pending quantities are recomputed once the transactions that changed
+    them before have committed, and their delete/insert can't conflict.
+    SQLite serializes writers itself.
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    lock_keys = sorted(set(_lock_key(*key) for key in keys))
+    for n in range(0, len(lock_keys), IN_CHUNK_SIZE):
+        session.execute(_lock_keys, {'keys': lock_keys[n:n+IN_CHUNK_SIZE]})
+
+
+def refresh_on_order(session, keys):
+    """
+    Recomputes the `ProductOnOrder` rows of the given `(supplier_id, sku)`
+    keys: one grouped query and a delete/insert per chunk of keys.
+    """
+    t = ProductOnOrder.__table__
+    by_supplier = {}
+    for supplier_id, sku in keys:
+        if supplier_id is not None and sku is not None:
+            by_supplier.setdefault(supplier_id, set()).add(sku)
+    _lock_on_order(session, [(supplier_id, sku)
+                             for supplier_id, skus in by_supplier.items()
+                             for sku in skus])
+    suppliers = sorted(by_supplier)
+    skus = sorted(set().union(*by_supplier.values())) if by_supplier else []
+    # chunks cover the cartesian product of their suppliers and skus, which
+    # may include keys not asked for, recomputing those is harmless
+    for n in range(0, len(suppliers), IN_CHUNK_SIZE):
+        chunk = suppliers[n:n+IN_CHUNK_SIZE]
+        for m in range(0, len(skus), IN_CHUNK_SIZE):
+            sku_chunk = skus[m:m+IN_CHUNK_SIZE]
+            rows = [dict(row) for row in session.execute(
+                _on_order_select(chunk, sku_chunk))]
+            session.execute(t.delete().where(t.c.supplier_id.in_(chunk))
+                                      .where(t.c.sku.in_(sku_chunk)))
+            if rows:
+                session.execute(t.insert(), rows)
+    if suppliers:
+        mark_changed(session, t.name)
+
+
+def rebuild_on_order(session=None):
+    """Recomputes the whole `ProductOnOrder` table."""
+    session = session or db.session
+    t = ProductOnOrder.__table__
+    if session.get_bind().dialect.name == 'postgresql':
+        # waits for, and then blocks, concurrent refresh_on_order() writes
+        session.execute('LOCK TABLE {} IN SHARE ROW EXCLUSIVE MODE'
+                        .format(t.name))
+    session.execute(t.delete())
+    rows = [dict(row) for row in session.execute(_on_order_select())]
+    if rows:
+        session.execute(t.insert(), rows)
+    mark_changed(session, t.name)
+
+
+def _history_values(obj, key, relationship=None, related_key=None):
+    """
+    Current and previous values of `key` on `obj`, and of `related_key` on
+    the current and previous objects of `relationship` (a foreign key set
+    through a relationship doesn't keep its previous value).
+    """
+    attrs = db.inspect(obj).attrs
+    values = set(attrs[key].history.sum())
+    if relationship is not None:
+        values.update(getattr(related, related_key) for related in
+                      attrs[relationship].history.sum() if related is not None)
+    return values
+
+
+@db.event.listens_for(Session, "after_flush")
+def update_on_order(session, flush_context):
+    # skus touched on each order (all of them when the order itself changed,
+    # e.g. its status) and its suppliers, before and after the flush
+    skus = defaultdict(set)
+    suppliers = defaultdict(set)
+    whole_orders = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, PurchaseOrderItem):
+            for order_id in _history_values(obj, 'order_id', 'order', 'id'):
+                skus[order_id].update(_history_values(obj, 'sku'))
+        elif isinstance(obj, PurchaseOrder):
+            whole_orders.add(obj.id)
+            suppliers[obj.id].update(_history_values(obj, 'supplier_id',
+                                                     'supplier',
+                                                     'supplier_id'))
+    ids = sorted((set(skus) | whole_orders) - set([None]))
+    if not ids:
+        return
+
+    i = PurchaseOrderItem.__table__
+    o = PurchaseOrder.__table__
+    for n in range(0, len(ids), IN_CHUNK_SIZE):
+        for row in session.execute(
+                select([o.c.id, o.c.supplier_id, i.c.sku])
+                .select_from(o.outerjoin(i, i.c.order_id == o.c.id))
+                .where(o.c.id.in_(ids[n:n+IN_CHUNK_SIZE]))):
+            suppliers[row.id].add(row.supplier_id)
+            if row.id in whole_orders:
+                skus[row.id].add(row.sku)
+    refresh_on_order(session, [(supplier_id, sku)
+                               for order_id in ids
+                               for supplier_id in suppliers[order_id]
+                               for sku in skus[order_id]])
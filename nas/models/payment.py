@@ -14,9 +14,20 @@ class Payment(db.Model):
     documents = association_proxy('document_payment', 'document')
 
     def add_documents(self, documents):
+        from .document import Document
+        documents = Document.load_balances(documents)
         for document in documents:
             document.add_payment(self)
 
+    def allocate(self, supplier=None, documents=None):
+        """
+        Allocates this payment FIFO among open documents of `supplier` or the
+        given `documents` with set based statements, see
+        `nas.models.allocation.allocate_payment`.
+        """
+        from .allocation import allocate_payment
+        return allocate_payment(self, supplier, documents)
+
 
 class DocumentPayment(db.Model):
     __tablename__ = 'document_payment'
@@ -24,10 +35,8 @@ class DocumentPayment(db.Model):
     payment_id = db.Column(db.Integer, db.ForeignKey('payment.id'), primary_key=True)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
 
-    payment = db.relationship(Payment, lazy='joined',
-                              backref='document_payments')
-    document = db.relationship('Document', lazy='joined',
-                               backref='document_payments')
+    payment = db.relationship(Payment, backref='document_payments')
+    document = db.relationship('Document', backref='document_payments')
 
     def __init__(self, payment, amount):
         self.payment = payment
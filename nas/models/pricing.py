@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import (MetaData, Table, Column, Unicode, Numeric, select,
+                        exists, and_, or_, literal)
+
+from . import db
+from .product import ProductSupplierInfo, ProductPriceHistory
+from ..utils.cache import mark_changed
+
+
+STAGING_CHUNK_SIZE = 5000
+
+#: upper bound (excluded) of the Numeric(10, 2) costs
+MAX_COST = Decimal('1e8')
+
+
+def _staging_table():
+    # dropped by PostgreSQL at the end of the transaction even if the
+    # statements using it fail
+    return Table('tmp_price_list', MetaData(),
+                 Column('code', Unicode(80), primary_key=True),
+                 Column('cost', Numeric(10, 2), nullable=False),
+                 prefixes=['TEMPORARY'], postgresql_on_commit='DROP')
+
+
+def parse_price(code, cost):
+    """
+    Returns the `(code, cost)` tuple of one price list entry with the cost
+    as a `Decimal`, raises ValueError when it isn't valid.
+    """
+    if not code:
+        raise ValueError("'code' field must be present")
+    try:
+        value = Decimal(str(cost).strip())
+    except InvalidOperation:
+        raise ValueError("cost '{}' is not a number".format(cost))
+    if not value.is_finite() or not 0 <= value < MAX_COST:
+        raise ValueError("cost '{}' out of range".format(cost))
+    return code, value
+
+
+def _record_history(session, supplier_id, select_changes):
+    """Inserts history rows from `select_changes` (product_id, old, new)."""
+    h = ProductPriceHistory.__table__
+    changes = select_changes.alias('changes')
+    session.execute(h.insert().from_select(
+        ['supplier_id', 'product_id', 'old_cost', 'new_cost', 'changed'],
+        select([literal(supplier_id), changes.c.product_id,
+                changes.c.old_cost, changes.c.new_cost,
+                literal(datetime.now(), h.c.changed.type)])))
+
+
+def _finish(session, supplier_id):
+    mark_changed(session, 'productsupplier_info', 'product_price_history')
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, ProductSupplierInfo) and \
+           obj.supplier_id == supplier_id:
+            session.expire(obj, ['base_cost'])
+
+
+def change_prices(supplier_id, percent, session=None):
+    """
+    Changes by `percent` (e.g. 12 or -5.5) the cost of every product of the
+    supplier, rounded to cents, with one INSERT ... SELECT for the history
+    and one UPDATE. Returns the number of updated rows.
+    """
+    session = session or db.session
+    session.flush()
+    psi = ProductSupplierInfo.__table__
+    factor = 1 + Decimal(str(percent)) / 100
+    new_cost = db.func.round(psi.c.base_cost * factor, 2)
+    criteria = and_(psi.c.supplier_id == supplier_id,
+                    psi.c.base_cost.isnot(None))
+
+    _record_history(session, supplier_id, select([
+        psi.c.product_id, psi.c.base_cost.label('old_cost'),
+        new_cost.label('new_cost')]).where(criteria))
+    updated = session.execute(psi.update().where(criteria)
+                                 .values(base_cost=new_cost)).rowcount
+    _finish(session, supplier_id)
+    return updated
+
+
+def load_price_list(supplier_id, prices, session=None):
+    """
+    Sets the cost of the supplier products from `prices`, an iterable of
+    `(code, cost)` tuples keyed by the supplier product code; ValueError is
+    raised if any of them is invalid (see `parse_price`).
+
+    The list is copied into a temporary table and applied with one UPDATE
+    (``UPDATE ... FROM`` on PostgreSQL, a correlated subquery elsewhere);
+    products whose cost doesn't change are left alone and get no history.
+    Returns a tuple with the number of updated rows and the list of codes
+    unknown for the supplier.
+    """
+    session = session or db.session
+    session.flush()
+    connection = session.connection()
+    psi = ProductSupplierInfo.__table__
+    rows = dict(parse_price(code, cost) for code, cost in prices)
+    rows = [{'code': code, 'cost': cost} for code, cost in rows.items()]
+
+    staging = _staging_table()
+    staging.create(connection)
+    try:
+        for n in range(0, len(rows), STAGING_CHUNK_SIZE):
+            connection.execute(staging.insert(),
+                               rows[n:n+STAGING_CHUNK_SIZE])
+
+        matches = and_(psi.c.supplier_id == supplier_id,
+                       staging.c.code == psi.c.code,
+                       or_(psi.c.base_cost.is_(None),
+                           psi.c.base_cost != staging.c.cost))
+        _record_history(session, supplier_id, select([
+            psi.c.product_id, psi.c.base_cost.label('old_cost'),
+            staging.c.cost.label('new_cost')]).where(matches))
+
+        if connection.dialect.name == 'postgresql':
+            stmt = psi.update().where(matches)\
+                      .values(base_cost=staging.c.cost)
+        else:
+            stmt = psi.update().where(exists().where(matches))\
+                      .values(base_cost=select([staging.c.cost])
+                              .where(staging.c.code == psi.c.code)
+                              .as_scalar())
+        updated = connection.execute(stmt).rowcount
+
+        unknown = [row.code for row in connection.execute(
+            select([staging.c.code]).where(~exists().where(and_(
+                psi.c.supplier_id == supplier_id,
+                psi.c.code == staging.c.code))).order_by(staging.c.code))]
+    except Exception:
+        # a failed statement aborts the whole transaction on PostgreSQL, the
+        # table goes away with its rollback and DROP would hide the error
+        if connection.dialect.name != 'postgresql':
+            staging.drop(connection)
+        raise
+    staging.drop(connection)
+
+    _finish(session, supplier_id)
+    return updated, unknown
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import re
+
+from sqlalchemy import (DDL, MetaData, Table, Column, Integer, UnicodeText,
+                        and_, or_, event, literal_column, select, text)
 from sqlalchemy.ext.associationproxy import association_proxy
 
 from . import db
@@ -14,16 +18,177 @@ class Product(db.Model):
 
     suppliers = association_proxy('suppliers_info', 'supplier')
 
+    @classmethod
+    def search(cls, terms, session=None):
+        """
+        Returns a query of the products matching every token of `terms` as a
+        prefix of their code, description, brand or supplier codes, best
+        matches first (an exact code match always comes first).
+
+        Backed by an FTS5 table on SQLite and by a full text GIN index plus
+        trigram indexes on PostgreSQL, other backends fall back to LIKE.
+        """
+        tokens = _tokenize(terms)
+        query = (session or db.session).query(cls)
+        if not tokens:
+            return query.filter(db.false())
+        dialect = query.session.get_bind().dialect.name
+        exact = db.func.lower(cls.code) == terms.strip().lower()
+        if dialect == 'sqlite':
+            match = literal_column(SEARCH_TABLE)
+            rank = db.func.bm25(match, *SEARCH_WEIGHTS)
+            return query.join(_search, _search.c.rowid == cls.id)\
+                        .filter(match.match(' '.join(
+                            '"{}"*'.format(t) for t in tokens)))\
+                        .order_by(exact.desc(), rank, cls.id)
+        if dialect == 'postgresql':
+            vector = literal_column('product.search_vector')
+            tsquery = db.func.to_tsquery(literal_column("'simple'"),
+                                         ' & '.join(t + ':*' for t in tokens))
+            psi = ProductSupplierInfo.__table__
+            by_supplier_code = cls.id.in_(
+                select([psi.c.product_id])
+                .where(db.func.lower(psi.c.code).like(
+                    terms.strip().lower() + '%')))
+            rank = db.func.ts_rank(vector, tsquery)
+            return query.filter(or_(vector.op('@@')(tsquery),
+                                    by_supplier_code))\
+                        .order_by(exact.desc(), rank.desc(), cls.id)
+        return query.filter(and_(*[
+            or_(db.func.lower(cls.code).like(t + '%'),
+                db.func.lower(cls.description).like('%' + t + '%'),
+                db.func.lower(cls.brand).like(t + '%'),
+                cls.suppliers_info.any(
+                    db.func.lower(ProductSupplierInfo.code).like(t + '%')))
+            for t in tokens])).order_by(exact.desc(), cls.code, cls.id)
+
 
 class ProductSupplierInfo(db.Model):
     __tablename__ = 'productsupplier_info'
+    __table_args__ = (
+        db.Index('ix_productsupplier_info_supplier_code', 'supplier_id',
+                 'code'),
+    )
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.supplier_id'), primary_key=True)
-    supplier = db.relationship('Supplier', backref='products_info', lazy='joined')
+    supplier = db.relationship('Supplier', backref='products_info')
 
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
-    product = db.relationship('Product', backref='suppliers_info', lazy='joined')
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True,
+                           index=True)
+    product = db.relationship('Product', backref='suppliers_info')
 
     code = db.Column(db.Unicode(80))
     description = db.Column(db.Unicode)
     base_cost = db.Column(db.Numeric(10, 2))
     minimum_purchase = db.Column(db.Integer, default=1)
+
+
+class ProductPriceHistory(db.Model):
+    """A change of `ProductSupplierInfo.base_cost`."""
+    __tablename__ = 'product_price_history'
+    id = db.Column(db.Integer, primary_key=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.supplier_id'),
+                            nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'),
+                           nullable=False)
+    old_cost = db.Column(db.Numeric(10, 2))
+    new_cost = db.Column(db.Numeric(10, 2))
+    changed = db.Column(db.DateTime, nullable=False)
+
+
+# Search index, kept up to date by the database itself (triggers on SQLite,
+# a generated column on PostgreSQL) so bulk statements are covered too.
+
+SEARCH_TABLE = 'product_search'
+# bm25() weights for code, description, brand and supplier_codes
+SEARCH_WEIGHTS = (10.0, 1.0, 2.0, 5.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# not part of db.metadata, created with the DDL below
+_search = Table(SEARCH_TABLE, MetaData(),
+                Column('rowid', Integer, primary_key=True),
+                Column('code', UnicodeText),
+                Column('description', UnicodeText),
+                Column('brand', UnicodeText),
+                Column('supplier_codes', UnicodeText))
+
+
+def _tokenize(terms):
+    return _TOKEN_RE.findall((terms or '').lower())
+
+
+_SUPPLIER_CODES = ("(SELECT group_concat(code, ' ') FROM productsupplier_info "
+                   "WHERE product_id = {0}.product_id)")
+
+_SQLITE_PRODUCT_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+    "code, description, brand, supplier_codes, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE TRIGGER IF NOT EXISTS product_search_ai AFTER INSERT ON product "
+    "BEGIN INSERT INTO product_search (rowid, code, description, brand, "
+    "supplier_codes) VALUES (new.id, new.code, new.description, new.brand, "
+    "''); END",
+    "CREATE TRIGGER IF NOT EXISTS product_search_au AFTER UPDATE ON product "
+    "BEGIN UPDATE product_search SET code = new.code, "
+    "description = new.description, brand = new.brand "
+    "WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS product_search_ad AFTER DELETE ON product "
+    "BEGIN DELETE FROM product_search WHERE rowid = old.id; END",
+)
+
+_SQLITE_SUPPLIER_INFO_DDL = tuple(
+    "CREATE TRIGGER IF NOT EXISTS product_search_psi_{0} AFTER {1} ON "
+    "productsupplier_info BEGIN {2} END".format(name, op, ' '.join(
+        "UPDATE product_search SET supplier_codes = {} WHERE rowid = "
+        "{}.product_id;".format(_SUPPLIER_CODES.format(row), row)
+        for row in rows))
+    for name, op, rows in (('ai', 'INSERT', ('new',)),
+                           ('au', 'UPDATE OF code, product_id',
+                            ('old', 'new')),
+                           ('ad', 'DELETE', ('old',))))
+
+_PG_PRODUCT_DDL = (
+    "ALTER TABLE product ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(code, '') || ' ' || "
+    "coalesce(description, '') || ' ' || coalesce(brand, ''))) STORED",
+    "CREATE INDEX ix_product_search_vector ON product "
+    "USING gin (search_vector)",
+)
+
+_PG_SUPPLIER_INFO_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX ix_productsupplier_info_code_trgm ON productsupplier_info "
+    "USING gin (lower(code) gin_trgm_ops)",
+)
+
+for _table, _dialect, _statements in (
+        (Product.__table__, 'sqlite', _SQLITE_PRODUCT_DDL),
+        (ProductSupplierInfo.__table__, 'sqlite', _SQLITE_SUPPLIER_INFO_DDL),
+        (Product.__table__, 'postgresql', _PG_PRODUCT_DDL),
+        (ProductSupplierInfo.__table__, 'postgresql', _PG_SUPPLIER_INFO_DDL)):
+    for _statement in _statements:
+        event.listen(_table, 'after_create',
+                     DDL(_statement).execute_if(dialect=_dialect))
+
+event.listen(Product.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS product_search')
+             .execute_if(dialect='sqlite'))
+
+
+def rebuild_search_index(session=None):
+    """
+    Creates (when missing) and fills the SQLite search index from scratch,
+    needed only for databases created before it existed.
+    """
+    session = session or db.session
+    if session.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in _SQLITE_PRODUCT_DDL + _SQLITE_SUPPLIER_INFO_DDL:
+        session.execute(text(statement))
+    session.execute(text("DELETE FROM product_search"))
+    session.execute(text(
+        "INSERT INTO product_search (rowid, code, description, brand, "
+        "supplier_codes) SELECT p.id, p.code, p.description, p.brand, "
+        "coalesce({}, '') FROM product AS p".format(
+            _SUPPLIER_CODES.replace('{0}.product_id', 'p.id'))))
+    session.commit()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import select, bindparam, case
+
+from . import db, IN_CHUNK_SIZE
+from .order import PurchaseOrder, PurchaseOrderItem, refresh_on_order
+from ..utils.cache import mark_changed
+
+
+def _merge(deliveries):
+    """Sums quantities of repeated items, keeping the first position."""
+    items = OrderedDict()
+    for position, delivery in enumerate(deliveries):
+        item = items.setdefault(delivery['id'], {
+            'iid': delivery['id'], 'position': position,
+            'received': 0, 'returned': 0})
+        item['received'] += delivery.get('received') or 0
+        item['returned'] += delivery.get('returned') or 0
+    return list(items.values())
+
+
+def receive_items(deliveries, receival_date=None, session=None):
+    """
+    Applies a delivery: `deliveries` is a list of dicts with the item `id`
+    and the `received` and `returned` quantities to add to it.
+
+    Items are updated with one executemany UPDATE, then the pending quantity
+    of every order something was received for is computed with one grouped
+    query and their `po_status` (partial or completed) and `receival_date`
+    (`receival_date`, today by default) are set with another executemany
+    UPDATE; deliveries only returning items leave their orders as they are.
+    Nothing goes through the unit of work, affected instances present in the
+    session are expired. `ProductOnOrder` is refreshed for the received skus.
+
+    Returns a tuple with the ids of the affected orders and a dict of errors
+    keyed by delivery position; when there are errors nothing is written.
+    """
+    session = session or db.session
+    receival_date = receival_date or date.today()
+    items = _merge(deliveries)
+    i = PurchaseOrderItem.__table__
+    o = PurchaseOrder.__table__
+
+    ids = [item['iid'] for item in items]
+    found = {}
+    for n in range(0, len(ids), IN_CHUNK_SIZE):
+        found.update((row.id, row) for row in session.execute(
+            select([i.c.id, i.c.order_id, i.c.sku, o.c.supplier_id,
+                    o.c.po_status])
+            .select_from(i.join(o, o.c.id == i.c.order_id))
+            .where(i.c.id.in_(ids[n:n+IN_CHUNK_SIZE]))))
+
+    errors = {}
+    for item in items:
+        row = found.get(item['iid'])
+        if row is None:
+            errors[item['position']] = 'Unknown item'
+        elif row.po_status in (PurchaseOrder.STATUS_CANCELLED,
+                               PurchaseOrder.STATUS_DRAFT):
+            errors[item['position']] = "Can't receive items of a {} " \
+                "order".format(PurchaseOrder._po_status[row.po_status])
+        else:
+            item['order_id'] = row.order_id
+    if errors or not items:
+        return [], errors
+
+    session.flush()
+    session.execute(
+        i.update().where(i.c.id == bindparam('iid')).values(
+            quantity_received=db.func.coalesce(i.c.quantity_received, 0) +
+                              bindparam('received'),
+            quantity_returned=db.func.coalesce(i.c.quantity_returned, 0) +
+                              bindparam('returned')),
+        [dict((k, item[k]) for k in ('iid', 'received', 'returned'))
+         for item in items])
+
+    orders = sorted(set(item['order_id'] for item in items))
+    receiving = sorted(set(item['order_id'] for item in items
+                           if item['received'] > 0))
+    pending_quantity = db.func.coalesce(i.c.quantity, 0) - \
+                       db.func.coalesce(i.c.quantity_received, 0)
+    statuses = []
+    for n in range(0, len(receiving), IN_CHUNK_SIZE):
+        for row in session.execute(
+                select([i.c.order_id,
+                        db.func.sum(case([(pending_quantity > 0,
+                                           pending_quantity)],
+                                         else_=0)).label('pending')])
+                .where(i.c.order_id.in_(receiving[n:n+IN_CHUNK_SIZE]))
+                .group_by(i.c.order_id)):
+            statuses.append({
+                'oid': row.order_id,
+                'status': PurchaseOrder.STATUS_COMPLETED if row.pending <= 0
+                          else PurchaseOrder.STATUS_PARTIAL,
+            })
+    if statuses:
+        session.execute(
+            o.update().where(o.c.id == bindparam('oid'))
+                      .values(po_status=bindparam('status'),
+                              receival_date=receival_date),
+            statuses)
+
+    # completed orders had nothing pending on their other items
+    refresh_on_order(session, set((found[item['iid']].supplier_id,
+                                   found[item['iid']].sku) for item in items))
+
+    mark_changed(session, 'purchaseorder', 'purchaseorder_item')
+    orders_ids = set(orders)
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, PurchaseOrder) and obj.id in orders_ids or \
+           isinstance(obj, PurchaseOrderItem) and obj.order_id in orders_ids:
+            session.expire(obj)
+    return orders, {}
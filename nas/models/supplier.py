@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 
+from datetime import datetime
 from decimal import Decimal
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import Session
 
-from . import db
+from . import db, IN_CHUNK_SIZE
 from .entity import Entity
 from .fiscal import FiscalData
 from .document import Document
 #from .product import ProductSupplierInfo
 
+#: session.info key holding suppliers whose expiration date must be recomputed
+STALE_SUPPLIERS = 'nas.stale_suppliers'
+
+
+def _as_date(value):
+    # Supplier.expiration_date is a DateTime while Document's is a Date
+    return value.date() if isinstance(value, datetime) else value
+
+
 class Supplier(Entity):
     __tablename__ = 'supplier'
     __mapper_args__ = {'polymorphic_identity': 'supplier'}
@@ -77,16 +88,117 @@ class Supplier(Entity):
         n = " ({0})".format(self.name) if self.name else ''
         return "{0}{1}".format(self.rz, n)
 
-    def _update_expiration_date(self):
-        doc = self.documents\
-                .filter(Document.doc_status.in_([Document.STATUS_PENDING,
-                                                 Document.STATUS_EXPIRED]))\
-                .order_by(Document.expiration_date.asc())\
-                .first()
-        if doc:
-            self.expiration_date = doc.expiration_date
-        else:
-            self.expiration_date = None
+    def _expiration_added(self, expiration_date):
+        """An open document expiring at `expiration_date` was added."""
+        if expiration_date is None:
+            return
+        current = self.expiration_date
+        if current is None or _as_date(expiration_date) < _as_date(current):
+            self.expiration_date = expiration_date
+
+    def _expiration_removed(self, expiration_date):
+        """
+        An open document expiring at `expiration_date` was paid or removed.
+
+        Only when it was the earliest one the expiration date is recomputed,
+        and that happens once per flush for all affected suppliers.
+        """
+        current = self.expiration_date
+        if expiration_date is None or current is None:
+            return
+        if _as_date(expiration_date) <= _as_date(current):
+            session = db.object_session(self)
+            if session is not None:
+                session.info.setdefault(STALE_SUPPLIERS, set()).add(self)
+            else:
+                self._expiration_stale = True
+
+    @classmethod
+    def _refresh_expiration_dates(cls, session, suppliers):
+        """Recomputes expiration date of `suppliers` with grouped queries."""
+        dates = earliest_expiration_dates(
+            session, [s.supplier_id for s in suppliers])
+        for supplier in suppliers:
+            supplier.expiration_date = dates.get(supplier.supplier_id)
+
+
+@db.event.listens_for(Session, "before_flush")
+def collect_stale_suppliers(session, flush_context, instances):
+    # suppliers marked while they weren't attached to any session
+    for obj in session.new:
+        if isinstance(obj, Supplier) and obj.__dict__.pop('_expiration_stale',
+                                                          False):
+            session.info.setdefault(STALE_SUPPLIERS, set()).add(obj)
+
+
+@db.event.listens_for(Session, "before_flush")
+def remove_deleted_documents(session, flush_context, instances):
+    # open documents being deleted no longer count on their supplier
+    for obj in session.deleted:
+        if not isinstance(obj, Document) or obj.doc_status not in \
+                (Document.STATUS_PENDING, Document.STATUS_EXPIRED):
+            continue
+        supplier = obj.supplier
+        if supplier is None:
+            continue
+        supplier.debt -= obj.total
+        if obj.doc_status == Document.STATUS_EXPIRED:
+            supplier.expired -= obj.total
+        supplier._expiration_removed(obj.expiration_date)
+
+
+@db.event.listens_for(Session, "after_flush_postexec")
+def refresh_stale_suppliers(session, flush_context):
+    # changes made here are picked up by the next flush (at latest on commit)
+    stale = session.info.pop(STALE_SUPPLIERS, None)
+    if stale:
+        stale = [s for s in stale if db.inspect(s).persistent]
+        if stale:
+            Supplier._refresh_expiration_dates(session, stale)
+
+
+@db.event.listens_for(Session, "after_rollback")
+def discard_stale_suppliers(session):
+    session.info.pop(STALE_SUPPLIERS, None)
+
+
+def earliest_expiration_dates(session, supplier_ids):
+    """
+    Returns a dict mapping supplier ids to the earliest expiration date of
+    their open (pending or expired) documents, with one grouped MIN() query
+    per chunk of ids. Suppliers without open documents are left out.
+    """
+    d = Document.__table__
+    ids = list(supplier_ids)
+    dates = {}
+    for i in range(0, len(ids), IN_CHUNK_SIZE):
+        dates.update(session.execute(
+            db.select([d.c.supplier_id, db.func.min(d.c.expiration_date)])
+              .where(d.c.supplier_id.in_(ids[i:i+IN_CHUNK_SIZE]))
+              .where(d.c.doc_status.in_([Document.STATUS_PENDING,
+                                         Document.STATUS_EXPIRED]))
+              .group_by(d.c.supplier_id)).fetchall())
+    return dates
+
+
+def refresh_expiration_dates(session, supplier_ids):
+    """
+    Recomputes the expiration date of the given suppliers with
+    `earliest_expiration_dates` and one executemany UPDATE, bypassing the
+    unit of work.
+
+    Values go through Python so the Date -> DateTime conversion is done by
+    the column type on every backend.
+    """
+    s = Supplier.__table__
+    ids = list(supplier_ids)
+    dates = earliest_expiration_dates(session, ids)
+    if ids:
+        session.execute(
+            s.update().where(s.c.supplier_id == db.bindparam('sid'))
+                      .values(expiration_date=db.bindparam('earliest')),
+            [{'sid': sid, 'earliest': dates.get(sid)} for sid in ids])
+
 
 @db.event.listens_for(Supplier, "init")
 def supplier_init(target, args, kwargs):
@@ -107,8 +219,7 @@ class SupplierContact(db.Model):
                            primary_key=True)
     role = db.Column(db.Unicode)
 
-    contact = db.relationship('Contact', backref='supplier_contacts',
-                              lazy='joined')
+    contact = db.relationship('Contact', backref='supplier_contacts')
 
     def __init__(self, contact, role):
         self.contact = contact
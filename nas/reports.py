@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.reports
+    ~~~~~~~~~~~
+
+    Aggregate reports computed with grouped queries.
+
+    :copyright: (c) 2017 by Augusto Roccasalva
+    :license: MIT, see LICENSE for more details.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from sqlalchemy import select, case, and_, or_
+
+from nas.models import (db, Entity, Document, DocumentPayment, Product,
+                        ProductSupplierInfo, Supplier, ProductOnOrder)
+from nas.utils.cache import get_cache, table_names
+
+
+#: (name, oldest, newest) days past expiration of each aging bucket, both
+#: inclusive, None when unbounded; 'current' holds documents not yet due
+AGING_BUCKETS = (
+    ('current', None, -1),
+    ('days_0_30', 0, 30),
+    ('days_31_60', 31, 60),
+    ('days_61_90', 61, 90),
+    ('days_over_90', 91, None),
+)
+
+AGING_CACHE_SIZE = 16
+
+#: tables read by the aging report (supplier names live in entity)
+AGING_TABLES = (Document, DocumentPayment, Entity)
+
+BATCH_SIZE = 1000
+
+_aging_cache = OrderedDict()
+_aging_lock = threading.Lock()
+
+
+def _aging_statement(as_of):
+    d = Document.__table__
+    e = Entity.__table__
+    dp = DocumentPayment.__table__
+
+    paid = select([dp.c.document_id, db.func.sum(dp.c.amount).label('paid')])\
+            .group_by(dp.c.document_id).alias('paid')
+    balance = d.c.total - db.func.coalesce(paid.c.paid, 0)
+
+    columns = [d.c.supplier_id, e.c.name_1.label('supplier')]
+    for name, oldest, newest in AGING_BUCKETS:
+        # days past due between oldest and newest means expiration_date
+        # between as_of - newest and as_of - oldest
+        criteria = []
+        if newest is not None:
+            criteria.append(d.c.expiration_date >= as_of - timedelta(newest))
+        if oldest is not None:
+            criteria.append(d.c.expiration_date <= as_of - timedelta(oldest))
+        if name == 'current':
+            criteria = [or_(d.c.expiration_date.is_(None), *criteria)]
+        columns.append(db.func.sum(case([(and_(*criteria), balance)],
+                                         else_=0)).label(name))
+    columns.append(db.func.sum(balance).label('total'))
+
+    return select(columns)\
+        .select_from(d.join(e, e.c.id == d.c.supplier_id)
+                      .outerjoin(paid, paid.c.document_id == d.c.id))\
+        .where(d.c.doc_status.in_([Document.STATUS_PENDING,
+                                   Document.STATUS_EXPIRED]))\
+        .group_by(d.c.supplier_id, e.c.name_1)\
+        .having(db.func.sum(balance) != 0)\
+        .order_by(d.c.supplier_id)
+
+
+def aging_version():
+    """
+    Version of the data behind the aging report: the response cache
+    generations of `AGING_TABLES`, bumped by every commit writing them (see
+    `nas.utils.cache`). None when the response cache is disabled.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    return tuple(cache.generation(t) for t in table_names(AGING_TABLES))
+
+
+def supplier_aging(as_of=None, cache=True, connection=None):
+    """
+    Returns the accounts payable aging of every supplier with open balance
+    as of `as_of` (today by default): a list of dicts with `supplier_id`,
+    `supplier`, the balance of each of `AGING_BUCKETS` and `total`.
+
+    Everything is computed with one grouped query. With `cache` (and the
+    response cache enabled) the result is kept in process and reused while
+    `aging_version` doesn't change.
+    """
+    as_of = as_of or date.today()
+    if connection is None:
+        connection = db.session.connection()
+
+    version = aging_version() if cache else None
+    key = None
+    if version is not None:
+        key = (as_of, version)
+        with _aging_lock:
+            if key in _aging_cache:
+                _aging_cache.move_to_end(key)
+                return _aging_cache[key]
+
+    rows = [dict(row) for row in connection.execute(_aging_statement(as_of))]
+
+    if key is not None:
+        with _aging_lock:
+            _aging_cache[key] = rows
+            while len(_aging_cache) > AGING_CACHE_SIZE:
+                _aging_cache.popitem(last=False)
+    return rows
+
+
+def _reorder_statement():
+    p = Product.__table__
+    psi = ProductSupplierInfo.__table__
+    s = Supplier.__table__
+    poo = ProductOnOrder.__table__
+
+    on_order = select([psi.c.product_id,
+                       db.func.sum(poo.c.quantity).label('on_order')])\
+        .select_from(psi.join(poo, and_(poo.c.supplier_id == psi.c.supplier_id,
+                                        poo.c.sku == psi.c.code)))\
+        .group_by(psi.c.product_id).alias('on_order')
+
+    # best supplier of each product: cheapest, then fastest to deliver
+    rank = db.func.row_number().over(
+        partition_by=p.c.id,
+        order_by=[psi.c.base_cost.is_(None), psi.c.base_cost,
+                  s.c.leap_time.is_(None), s.c.leap_time, psi.c.supplier_id])
+    ranked = select([
+        p.c.id.label('product_id'), p.c.code, p.c.description,
+        psi.c.supplier_id, psi.c.code.label('supplier_code'),
+        psi.c.base_cost,
+        db.func.coalesce(psi.c.minimum_purchase, 1).label('minimum_purchase'),
+        s.c.leap_time,
+        db.func.coalesce(on_order.c.on_order, 0).label('on_order'),
+        rank.label('rank'),
+    ]).select_from(
+        p.join(psi, psi.c.product_id == p.c.id)
+         .join(s, s.c.supplier_id == psi.c.supplier_id)
+         .outerjoin(on_order, on_order.c.product_id == p.c.id)
+    ).alias('ranked')
+
+    return select([c for c in ranked.c if c.name != 'rank'])\
+        .where(ranked.c.rank == 1)\
+        .where(ranked.c.on_order < ranked.c.minimum_purchase)\
+        .order_by(ranked.c.product_id)
+
+
+def iter_reorder_suggestions(today=None, batch_size=BATCH_SIZE,
+                             connection=None):
+    """
+    Yields a purchase suggestion for each product with less than one
+    minimum purchase lot of its best supplier (cheapest, then with the
+    shortest lead time) pending on open orders, as read from
+    `ProductOnOrder`.
+
+    Suggestions are dicts with the product and supplier data, the
+    `quantity` to order (the minimum purchase), its `cost` and the
+    `expected_date` of arrival. The whole catalog is processed with one
+    query, read in batches of `batch_size` rows.
+    """
+    today = today or date.today()
+    if connection is None:
+        connection = db.session.connection()
+    result = connection.execution_options(stream_results=True)\
+                       .execute(_reorder_statement())
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                suggestion = dict(row)
+                suggestion['quantity'] = row.minimum_purchase
+                suggestion['cost'] = None if row.base_cost is None \
+                    else row.base_cost * row.minimum_purchase
+                suggestion['expected_date'] = today + timedelta(
+                    row.leap_time or 0)
+                yield suggestion
+    finally:
+        result.close()
@@ -1,6 +1,18 @@
 # -*- coding: utf-8 -*-
 
-from flask import Blueprint, make_response, json, current_app
+import time
+from collections.abc import Iterator
+
+from flask import (Blueprint, Response, make_response, request,
+                   stream_with_context)
+
+from .cache import get_cache, table_names
+from .compression import compress_response, encoded_etag, negotiate_encoding
+from .encoders import dumps
+from .metrics import request_timing
+
+
+STREAM_CHUNK_SIZE = 100
 
 
 def update_model(model, properties):
@@ -25,30 +37,148 @@ def unpack(value):
     return value, 200, {}
 
 
-def _make_response(data, code, headers=None):
-    settings = {}
-    if current_app.debug:
-        settings.setdefault('indent', 4)
-        settings.setdefault('sort_keys', True)
+def _is_conditional_get():
+    return request.method in ('GET', 'HEAD')
 
-    data = json.dumps(data, **settings)
+
+def _make_response(data, code, headers=None, etag=True):
+    timing = request_timing()
+    if timing is not None:
+        start = time.perf_counter()
+    data = dumps(data)
+    if timing is not None:
+        timing.encode += time.perf_counter() - start
 
     resp = make_response(data, code)
     resp.headers.extend(headers or {})
     resp.headers['Content-Type'] = 'application/json'
+    if etag and code == 200 and _is_conditional_get():
+        if isinstance(etag, str):
+            resp.set_etag(etag)
+        else:
+            resp.add_etag()
+    return resp
+
+
+def _finish_response(resp, compress=None):
+    """Compresses `resp` and answers conditional requests matching it."""
+    compress_response(resp, compress)
+    if resp.status_code == 200 and _is_conditional_get() and \
+            resp.get_etag()[0]:
+        resp.make_conditional(request)
+    return resp
+
+
+def _cached_response(cached, compress=None):
+    body, headers = cached
+    return _finish_response(Response(body, 200, headers), compress)
+
+
+def _not_modified(tag, compress=None):
+    """
+    304 response when the request matches `tag`, or the tag of the
+    representation `compress` would send, None otherwise.
+    """
+    encoding = compress is not False and negotiate_encoding()
+    for etag in (encoded_etag(tag, encoding), tag):
+        if etag in request.if_none_match:
+            resp = Response(status=304)
+            resp.set_etag(etag)
+            if encoding:
+                resp.vary.add('Accept-Encoding')
+            return resp
+    return None
+
+
+def _iter_json_array(rows, chunk_size=STREAM_CHUNK_SIZE):
+    """Yields a JSON array from `rows`, joining `chunk_size` rows per chunk."""
+    yield b'['
+    chunk = []
+    first = True
+    for row in rows:
+        chunk.append(dumps(row, pretty=False))
+        if len(chunk) >= chunk_size:
+            yield (b'' if first else b',') + b','.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield (b'' if first else b',') + b','.join(chunk)
+    yield b']'
+
+
+def _make_stream_response(rows, code, headers=None):
+    resp = Response(stream_with_context(_iter_json_array(rows)), code)
+    resp.headers.extend(headers or {})
+    resp.headers['Content-Type'] = 'application/json'
     return resp
 
 
 class RestBlueprint(Blueprint):
+    """
+    Blueprint whose views return plain data to be serialized as JSON.
 
-    def route(self, rule, **options):
+    Views may return `data`, `(data, code)` or `(data, code, headers)`, or an
+    already built `Response`, which is sent untouched. When
+    `data` is an iterator (e.g. a generator of rows), or the route is declared
+    with `stream=True`, the rows are sent as a chunked JSON array as they are
+    produced instead of being serialized up front.
+
+    Successful GET responses carry an ETag (a hash of the body) and honour
+    `If-None-Match` with 304. Pass `etag=False` to opt out, or a callable
+    receiving the view arguments that returns the tag (or None), in which
+    case a matching request is answered before running the view at all.
+
+    With `cache` set to a model (or a tuple of models/table names) the
+    serialized GET responses are kept in the response cache, keyed by endpoint
+    and arguments, until a change on any of those tables is committed or
+    `cache_ttl` seconds elapse.
+
+    Responses are compressed as negotiated by `Accept-Encoding` (see
+    `nas.utils.compression`), `compress` sets the level for the route (an int
+    or a dict by encoding) or disables it with False.
+    """
+
+    def route(self, rule, stream=False, etag=True, cache=None, cache_ttl=None,
+              compress=None, **options):
         def decorator(f):
             endpoint = options.pop("endpoint", f.__name__)
+            if cache is not None:
+                tables = table_names(cache if isinstance(cache, tuple)
+                                     else (cache,))
 
             def new_f(*args, **kwargs):
+                tag = etag
+                if callable(etag):
+                    tag = _is_conditional_get() and etag(*args, **kwargs)
+                    not_modified = tag and _not_modified(tag, compress)
+                    if not_modified:
+                        return not_modified
+                    tag = tag or True
+
+                response_cache = cache_key = None
+                if cache is not None and request.method == 'GET':
+                    response_cache = get_cache()
+                    if response_cache is not None:
+                        cache_key = response_cache.make_key(tables)
+                        cached = response_cache.get(cache_key)
+                        if cached is not None:
+                            return _cached_response(cached, compress)
+
                 resp = f(*args, **kwargs)
+                if isinstance(resp, Response):
+                    return resp
                 data, code, headers = unpack(resp)
-                return _make_response(data, code, headers)
+                if stream or isinstance(data, Iterator):
+                    return compress_response(
+                        _make_stream_response(data, code, headers), compress)
+                resp = _make_response(data, code, headers, tag)
+                # the response cache keeps uncompressed bodies, compressed
+                # ones are cached by ETag in nas.utils.compression
+                if cache_key is not None and resp.status_code == 200:
+                    response_cache.set(cache_key, (resp.get_data(),
+                                                   list(resp.headers)),
+                                       cache_ttl)
+                return _finish_response(resp, compress)
 
             self.add_url_rule(rule, endpoint, new_f, **options)
 
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.utils.cache
+    ~~~~~~~~~~~~~~~
+
+    Read-through cache for serialized REST responses.
+
+    Cached entries are keyed by endpoint, request path/arguments and the
+    current *generation* of each table the response depends on. Committing a
+    change to one of those tables bumps its generation, so stale entries are
+    never served again and simply age out of the backend.
+"""
+
+import os
+import json
+import stat
+import time
+import hashlib
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from itertools import chain
+
+from flask import current_app, has_app_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+#: session.info key holding the names of the tables changed on a transaction
+CHANGED_TABLES = 'nas.changed_tables'
+
+
+class LRUCache(object):
+    """In-process least recently used cache with per entry expiration."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileSystemCache(object):
+    """
+    Cache stored as files in a local directory, so it is shared by all the
+    worker processes of a host.
+
+    The directory must be given, it is created private (0700) and refused
+    when another user owns it or it is accessible by others. Values are
+    strings or ``(body, headers)`` tuples, stored as a JSON header line
+    followed by the raw body, so reading an entry never runs code. Beyond
+    `maxsize` entries the least recently written are removed on write,
+    entries without expiration (table generations) are kept.
+    """
+
+    _TMP_PREFIX = '.tmp-'
+    _PERSISTENT_PREFIX = 'p-'
+
+    def __init__(self, path, ttl=300, maxsize=1024):
+        if not path:
+            raise ValueError("FileSystemCache needs a directory")
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        st = os.lstat(self.path)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.geteuid() or \
+                st.st_mode & 0o077:
+            raise ValueError("Unsafe cache directory {!r}: it must be a "
+                             "directory owned by the current user with mode "
+                             "0700".format(self.path))
+
+    def _filename(self, key, persistent=False):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        if persistent:
+            name = self._PERSISTENT_PREFIX + name
+        return os.path.join(self.path, name)
+
+    def _open(self, key):
+        try:
+            return open(self._filename(key), 'rb')
+        except (IOError, OSError):
+            return open(self._filename(key, persistent=True), 'rb')
+
+    def get(self, key):
+        try:
+            with self._open(key) as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+        except (IOError, OSError, ValueError):
+            return None
+        expires = header.get('expires')
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        if 'headers' in header:
+            return body, [tuple(h) for h in header['headers']]
+        return header.get('value')
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        header = {'expires': time.time() + ttl if ttl else None}
+        if isinstance(value, str):
+            header['value'] = value
+            body = b''
+        else:
+            body, headers = value
+            header['headers'] = [list(h) for h in headers]
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix=self._TMP_PREFIX)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            f.write(body)
+        os.replace(tmp, self._filename(key, persistent=not ttl))
+        if ttl:
+            self._prune()
+
+    def _prune(self):
+        names = [n for n in os.listdir(self.path)
+                 if not n.startswith((self._TMP_PREFIX,
+                                      self._PERSISTENT_PREFIX))]
+        if len(names) <= self.maxsize:
+            return
+        entries = []
+        for name in names:
+            try:
+                entries.append((os.stat(os.path.join(self.path, name))
+                                .st_mtime, name))
+            except OSError:
+                pass
+        # drop a tenth more than needed, so pruning doesn't run on every set
+        entries.sort()
+        for _, name in entries[:len(entries) - self.maxsize * 9 // 10]:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+    def delete(self, key):
+        for persistent in (False, True):
+            try:
+                os.remove(self._filename(key, persistent))
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+
+class ResponseCache(object):
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def generation(self, table):
+        key = 'gen:' + table
+        gen = self.backend.get(key)
+        if gen is None:
+            gen = uuid.uuid4().hex
+            self.backend.set(key, gen, ttl=0)
+        return gen
+
+    def invalidate(self, *tables):
+        for table in tables:
+            self.backend.set('gen:' + table, uuid.uuid4().hex, ttl=0)
+
+    def make_key(self, tables):
+        gens = ','.join(self.generation(t) for t in tables)
+        return 'resp:{}:{}:{}'.format(request.endpoint, request.full_path,
+                                      gens)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+
+_backends = {
+    'lru': lambda config: LRUCache(config.get('RESPONSE_CACHE_SIZE', 1024),
+                                   config.get('RESPONSE_CACHE_TTL', 300)),
+    'filesystem': lambda config: FileSystemCache(
+        config.get('RESPONSE_CACHE_DIR'), config.get('RESPONSE_CACHE_TTL', 300),
+        config.get('RESPONSE_CACHE_SIZE', 1024)),
+}
+
+
+def configure_cache(app):
+    cache_type = app.config.get('RESPONSE_CACHE_TYPE')
+    if cache_type == 'auto':
+        cache_type = 'filesystem' if app.config.get('RESPONSE_CACHE_DIR') \
+                     else 'lru'
+    if cache_type:
+        backend = _backends[cache_type](app.config)
+        app.extensions['nas_cache'] = ResponseCache(backend)
+
+
+def get_cache():
+    """Returns the response cache of the current app, None if disabled."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('nas_cache')
+
+
+def table_names(models):
+    """Names of the tables backing `models` (mapped classes or table names)."""
+    names = []
+    for model in models:
+        if isinstance(model, str):
+            names.append(model)
+        else:
+            names.extend(t.name for t in inspect(model).tables)
+    return sorted(set(names))
+
+
+def mark_changed(session, *tables):
+    """
+    Invalidates cached responses depending on `tables` when the current
+    transaction of `session` commits. Needed for writes that bypass the unit
+    of work, like Core inserts.
+    """
+    session.info.setdefault(CHANGED_TABLES, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_changed_tables(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        mark_changed(session, *(t.name for t in inspect(obj).mapper.tables))
+
+
+@event.listens_for(Session, "after_bulk_update")
+def collect_bulk_update(update_context):
+    mark_changed(update_context.session,
+                 *(t.name for t in update_context.mapper.tables))
+
+
+@event.listens_for(Session, "after_bulk_delete")
+def collect_bulk_delete(delete_context):
+    mark_changed(delete_context.session,
+                 *(t.name for t in delete_context.mapper.tables))
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_changed_tables(session):
+    tables = session.info.pop(CHANGED_TABLES, None)
+    cache = get_cache()
+    if tables and cache is not None:
+        cache.invalidate(*tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_changed_tables(session):
+    session.info.pop(CHANGED_TABLES, None)
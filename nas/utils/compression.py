@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.utils.compression
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    ``Accept-Encoding`` negotiated compression of REST responses: gzip, and
+    brotli when the `brotli` package is installed.
+
+    Compressed bodies of responses carrying an ETag are kept in a per process
+    LRU keyed by URL, tag, encoding and level, so a popular (or response
+    cached) payload is compressed once instead of on every request.
+"""
+
+import gzip
+import zlib
+from functools import lru_cache
+
+from flask import current_app, request
+
+from .cache import LRUCache
+
+
+#: encodings in order of preference when the client accepts several
+ENCODINGS = ('br', 'gzip')
+
+#: maximum level accepted by each encoding
+MAX_LEVEL = {'br': 11, 'gzip': 9}
+
+#: levels used when neither the route nor `COMPRESS_LEVELS` give one
+DEFAULT_LEVELS = {'br': 5, 'gzip': 6}
+
+
+@lru_cache(maxsize=None)
+def _brotli():
+    # optional dependency, imported on first use
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def available_encodings():
+    return tuple(e for e in ENCODINGS if e != 'br' or _brotli() is not None)
+
+
+def negotiate_encoding():
+    """Best encoding accepted by the current request, None for identity."""
+    accept = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def encoded_etag(tag, encoding):
+    """ETag of the `encoding` representation of a response tagged `tag`."""
+    return '{}-{}'.format(tag, encoding) if encoding else tag
+
+
+def _level(encoding, level):
+    if isinstance(level, dict):
+        level = level.get(encoding)
+    if level is None or level is True:
+        levels = current_app.config.get('COMPRESS_LEVELS') or {}
+        level = levels.get(encoding, DEFAULT_LEVELS[encoding])
+    return min(level, MAX_LEVEL[encoding])
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return _brotli().compress(data, quality=level)
+    # mtime=0 keeps the output (and so the cached bytes) deterministic
+    return gzip.compress(data, level, mtime=0)
+
+
+def _compressor(encoding, level):
+    if encoding == 'br':
+        c = _brotli().Compressor(quality=level)
+        return lambda data: c.process(data) + c.flush(), c.finish
+    c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (lambda data: c.compress(data) + c.flush(zlib.Z_SYNC_FLUSH),
+            c.flush)
+
+
+def _iter_compressed(chunks, encoding, level):
+    process, finish = _compressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            yield process(chunk)
+    yield finish()
+
+
+def _compressible(resp):
+    return (200 <= resp.status_code < 300 and resp.status_code != 204 and
+            'Content-Encoding' not in resp.headers)
+
+
+def compress_response(resp, level=None):
+    """
+    Compresses `resp` in place with the encoding negotiated for the current
+    request. `level` is the route option: False disables compression, an int
+    sets the level of any encoding (capped to its maximum) and a dict maps
+    encodings to levels, None (or a missing encoding) uses `COMPRESS_LEVELS`.
+
+    Buffered bodies smaller than `COMPRESS_MIN_SIZE` are sent as they are,
+    streamed bodies are always compressed (their size isn't known) flushing
+    each chunk. The ETag of a compressed response gets the encoding appended.
+    """
+    config = current_app.config
+    if level is False or not config.get('COMPRESS_ENABLED', True) or \
+            not _compressible(resp):
+        return resp
+
+    if resp.is_streamed:
+        resp.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding()
+        if encoding is not None:
+            resp.response = _iter_compressed(resp.response, encoding,
+                                             _level(encoding, level))
+            resp.headers['Content-Encoding'] = encoding
+        return resp
+
+    data = resp.get_data()
+    if len(data) < config.get('COMPRESS_MIN_SIZE', 1024):
+        return resp
+    resp.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return resp
+
+    level = _level(encoding, level)
+    tag, weak = resp.get_etag()
+    cache = current_app.extensions.get('nas_compression')
+    # the URL is part of the key as tags given by views needn't depend on
+    # the query string
+    key = None
+    if tag and cache is not None:
+        key = (request.full_path, tag, encoding, level)
+    compressed = cache.get(key) if key is not None else None
+    if compressed is None:
+        compressed = compress(data, encoding, level)
+        if key is not None:
+            cache.set(key, compressed)
+
+    resp.set_data(compressed)
+    resp.headers['Content-Encoding'] = encoding
+    if tag:
+        resp.set_etag(encoded_etag(tag, encoding), weak)
+    return resp
+
+
+def configure_compression(app):
+    size = app.config.get('COMPRESS_CACHE_SIZE', 256)
+    if app.config.get('COMPRESS_ENABLED', True) and size:
+        # entries don't go stale, the ETag of the payload is in their key
+        app.extensions['nas_compression'] = LRUCache(size, ttl=None)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.utils.encoders
+    ~~~~~~~~~~~~~~~~~~
+
+    JSON encoders of REST responses. The `JSON_BACKEND` setting picks one:
+    ``'orjson'``, ``'stdlib'``, ``'auto'`` (orjson when installed, the
+    standard library otherwise) or the dotted path of a callable
+    ``dumps(obj, pretty=False)`` returning UTF-8 encoded bytes.
+
+    All of them encode `Decimal` as a string (keeping its exact digits) and
+    dates, times and datetimes in ISO 8601.
+"""
+
+import json
+from datetime import date, time
+from decimal import Decimal
+from uuid import UUID
+
+from flask import current_app
+from werkzeug.utils import import_string
+
+
+def default(value):
+    """Encodes the values JSON has no type for."""
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+
+_compact = json.JSONEncoder(default=default, ensure_ascii=False,
+                            separators=(',', ':'))
+_pretty = json.JSONEncoder(default=default, ensure_ascii=False,
+                           indent=4, sort_keys=True)
+
+
+def stdlib_dumps(obj, pretty=False):
+    return (_pretty if pretty else _compact).encode(obj).encode('utf-8')
+
+
+def orjson_dumps():
+    """Returns a `dumps` using orjson, raises ImportError if missing."""
+    import orjson
+
+    compact = orjson.OPT_NON_STR_KEYS
+    indented = compact | orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+
+    def dumps(obj, pretty=False):
+        # orjson encodes dates and datetimes in ISO 8601 itself
+        return orjson.dumps(obj, default=default,
+                            option=indented if pretty else compact)
+    return dumps
+
+
+def load_encoder(backend='auto'):
+    """Returns the `dumps` callable of `backend`, see module docs."""
+    if callable(backend):
+        return backend
+    if backend == 'auto':
+        try:
+            return orjson_dumps()
+        except ImportError:
+            return stdlib_dumps
+    if backend == 'orjson':
+        return orjson_dumps()
+    if backend == 'stdlib':
+        return stdlib_dumps
+    return import_string(backend)
+
+
+def dumps(obj, pretty=None):
+    """
+    Encodes `obj` with the encoder of the current app, pretty printed when
+    `pretty` is true (by default in debug mode).
+    """
+    encoder = current_app.extensions.get('nas_json', stdlib_dumps)
+    return encoder(obj, current_app.debug if pretty is None else pretty)
+
+
+def configure_json(app):
+    app.extensions['nas_json'] = load_encoder(
+        app.config.get('JSON_BACKEND', 'auto'))
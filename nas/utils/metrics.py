@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.utils.metrics
+    ~~~~~~~~~~~~~~~~~
+
+    Per-request instrumentation: number of SQL queries, time spent on the
+    database, on JSON encoding and in total. Each response reports them in a
+    `Server-Timing` header and they are aggregated, per endpoint, in
+    histograms exposed in Prometheus text format, along with connection pool
+    usage and checkout wait times.
+
+    Nothing is hooked unless `METRICS_ENABLED` is set, so the only cost left
+    when disabled is a lookup on `flask.g` while encoding. Histograms are
+    kept per process.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class RequestTiming(object):
+
+    __slots__ = ('start', 'queries', 'db', 'encode')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.encode = 0.0
+
+
+def request_timing():
+    """Returns the timing of the current request, None when not measuring."""
+    return g.get('_nas_timing') if has_request_context() else None
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _histogram_lines(name, labels, h):
+    lines = []
+    cumulative = 0
+    for le, count in zip(h.buckets + ('+Inf',), h.counts):
+        cumulative += count
+        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, le,
+                                                         cumulative))
+    lines.append('{}_sum{{{}}} {}'.format(name, labels, h.sum))
+    lines.append('{}_count{{{}}} {}'.format(name, labels, h.count))
+    return lines
+
+
+class Metrics(object):
+
+    _metrics = (
+        ('nas_request_duration_seconds', 'Total time spent on requests',
+         DURATION_BUCKETS),
+        ('nas_db_duration_seconds', 'Time spent executing SQL per request',
+         DURATION_BUCKETS),
+        ('nas_encode_duration_seconds',
+         'Time spent JSON encoding responses per request', DURATION_BUCKETS),
+        ('nas_db_queries', 'SQL queries issued per request', QUERY_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = dict((name, {}) for name, _, _ in self._metrics)
+        self._buckets = dict((name, b) for name, _, b in self._metrics)
+        self.collectors = []
+
+    def observe(self, name, endpoint, value):
+        with self._lock:
+            histograms = self._histograms[name]
+            h = histograms.get(endpoint)
+            if h is None:
+                h = histograms[endpoint] = Histogram(self._buckets[name])
+            h.observe(value)
+
+    def record(self, endpoint, timing, total):
+        self.observe('nas_request_duration_seconds', endpoint, total)
+        self.observe('nas_db_duration_seconds', endpoint, timing.db)
+        self.observe('nas_encode_duration_seconds', endpoint, timing.encode)
+        self.observe('nas_db_queries', endpoint, timing.queries)
+
+    def render(self):
+        """Returns all metrics in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, description, buckets in self._metrics:
+                lines.append('# HELP {} {}'.format(name, description))
+                lines.append('# TYPE {} histogram'.format(name))
+                for endpoint, h in sorted(self._histograms[name].items()):
+                    lines.extend(_histogram_lines(
+                        name, 'endpoint="{}"'.format(endpoint), h))
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A `QueuePool` measuring how long checkouts wait for a connection (this
+    includes opening new ones) and counting checkouts that timed out.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedQueuePool, self).__init__(*args, **kwargs)
+        self.wait = Histogram(DURATION_BUCKETS)
+        self.timeouts = 0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.wait.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.wait, pool.timeouts = self.wait, self.timeouts
+        return pool
+
+
+_POOL_METRICS = (
+    ('nas_db_pool_size', 'gauge', 'Connections kept open by the pool'),
+    ('nas_db_pool_checked_out', 'gauge', 'Connections in use'),
+    ('nas_db_pool_checked_in', 'gauge', 'Idle connections in the pool'),
+    ('nas_db_pool_overflow', 'gauge', 'Connections open beyond pool size'),
+    ('nas_db_pool_wait_seconds', 'histogram',
+     'Time spent waiting for a connection on checkout'),
+    ('nas_db_pool_timeouts_total', 'counter',
+     'Checkouts that timed out waiting for a connection'),
+)
+
+
+def _pool_samples(name, pool):
+    """Returns a dict with the sample lines of `pool` by metric name."""
+    labels = 'pool="{}"'.format(name)
+    samples = {}
+    for metric, value in (('nas_db_pool_size', pool.size()),
+                          ('nas_db_pool_checked_out', pool.checkedout()),
+                          ('nas_db_pool_checked_in', pool.checkedin()),
+                          ('nas_db_pool_overflow', max(pool.overflow(), 0))):
+        samples[metric] = ['{}{{{}}} {}'.format(metric, labels, value)]
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._stats_lock:
+            samples['nas_db_pool_wait_seconds'] = _histogram_lines(
+                'nas_db_pool_wait_seconds', labels, pool.wait)
+            samples['nas_db_pool_timeouts_total'] = [
+                'nas_db_pool_timeouts_total{{{}}} {}'.format(labels,
+                                                             pool.timeouts)]
+    return samples
+
+
+def _make_pool_collector(app):
+    def collect():
+        from flask_sqlalchemy import get_state
+        samples = []
+        connectors = get_state(app).connectors
+        for bind in sorted(connectors, key=lambda b: b or ''):
+            pool = connectors[bind].get_engine().pool
+            if isinstance(pool, QueuePool):
+                samples.append(_pool_samples(bind or 'default', pool))
+        lines = []
+        for name, kind, description in _POOL_METRICS:
+            values = [l for s in samples for l in s.get(name, ())]
+            if values:
+                lines.append('# HELP {} {}'.format(name, description))
+                lines.append('# TYPE {} {}'.format(name, kind))
+                lines.extend(values)
+        return lines
+    return collect
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    # kept on the execution context, which is discarded with it even when
+    # the statement fails
+    if context is not None:
+        context._nas_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    start = getattr(context, '_nas_start', None)
+    timing = request_timing()
+    if timing is not None and start is not None:
+        timing.queries += 1
+        timing.db += time.perf_counter() - start
+
+
+def _start_request():
+    g._nas_timing = RequestTiming()
+
+
+def _make_finish_request(metrics):
+    def finish_request(response):
+        timing = g.pop('_nas_timing', None)
+        if timing is None:
+            return response
+        total = time.perf_counter() - timing.start
+        response.headers['Server-Timing'] = ', '.join([
+            'db;dur={:.3f};desc="{} queries"'.format(timing.db * 1000,
+                                                    timing.queries),
+            'encode;dur={:.3f}'.format(timing.encode * 1000),
+            'total;dur={:.3f}'.format(total * 1000),
+        ])
+        metrics.record(request.endpoint or 'unknown', timing, total)
+        return response
+    return finish_request
+
+
+def configure_metrics(app):
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    metrics = app.extensions['nas_metrics'] = Metrics()
+    metrics.collectors.append(_make_pool_collector(app))
+    if not event.contains(Engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_make_finish_request(metrics))
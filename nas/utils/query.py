@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+import base64
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import request, current_app, json
+from sqlalchemy import and_, or_, inspect
+from sqlalchemy.orm import load_only, noload, selectinload, undefer
+from sqlalchemy.sql.util import find_tables
+from werkzeug.urls import url_encode
+from werkzeug.exceptions import BadRequest
+
+from .cache import LRUCache, get_cache
+from .encoders import stdlib_dumps
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def encode_cursor(values):
+    # dates in ISO 8601 and decimals as strings, as _cursor_value() expects
+    data = stdlib_dumps(values)
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise BadRequest("Invalid 'after' cursor")
+    if not isinstance(values, list) or len(values) != 2:
+        raise BadRequest("Invalid 'after' cursor")
+    return values
+
+
+def _cursor_value(column, value):
+    """
+    Converts the decoded cursor `value` to the Python type of `column`, so a
+    tampered cursor is answered with 400 instead of failing in the database.
+    """
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+    try:
+        if python_type is int:
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError
+        elif python_type in (Decimal, float):
+            if isinstance(value, bool) or \
+                    not isinstance(value, (int, float, str)):
+                raise ValueError
+            value = python_type(value)
+        elif python_type is str:
+            if not isinstance(value, str):
+                raise ValueError
+        elif python_type in (date, datetime):
+            value = python_type.fromisoformat(value)
+        elif python_type is not None and not isinstance(value, python_type):
+            raise ValueError
+    except (ValueError, TypeError, InvalidOperation):
+        raise BadRequest("Invalid 'after' cursor")
+    return value
+
+
+def _parse_limit(default_limit, max_limit):
+    limit = request.args.get('limit', default_limit)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise BadRequest("'limit' must be an integer")
+    if limit < 1:
+        raise BadRequest("'limit' must be greater than zero")
+    return min(limit, max_limit)
+
+
+def _parse_sort(model, pk, sortable):
+    sort = request.args.get('sort')
+    if not sort:
+        return None, False
+    desc = sort.startswith('-')
+    name = sort.lstrip('-')
+    if name == pk:
+        return None, desc
+    if name not in sortable:
+        raise BadRequest("Can't sort by '{}'".format(name))
+    return getattr(model, name), desc
+
+
+def count_query(query):
+    """
+    Returns the number of rows `query` would produce.
+
+    The ordering is dropped since it doesn't change the result. With
+    `PAGINATION_COUNT_TTL` set the value is kept in a per process LRU keyed by
+    the query statement, its parameters and, when the response cache is
+    enabled, the generations of the tables it reads: committing a change to
+    one of them drops the cached totals as it does with cached responses.
+    """
+    query = query.order_by(None)
+    counts = current_app.extensions.get('nas_count_cache')
+    if counts is None:
+        return query.count()
+
+    stmt = query.statement
+    compiled = stmt.compile()
+    key = (str(compiled), tuple(sorted(compiled.params.items())))
+    cache = get_cache()
+    if cache is not None:
+        tables = sorted(set(t.name for t in find_tables(stmt)))
+        key += tuple(cache.generation(t) for t in tables)
+    total = counts.get(key)
+    if total is None:
+        total = query.count()
+        counts.set(key, total)
+    return total
+
+
+def configure_pagination(app):
+    ttl = app.config.get('PAGINATION_COUNT_TTL')
+    if ttl:
+        app.extensions['nas_count_cache'] = LRUCache(
+            app.config.get('PAGINATION_COUNT_CACHE_SIZE', 1024), ttl)
+
+
+def paginate(query, model, sortable=(), default_limit=DEFAULT_LIMIT,
+             max_limit=MAX_LIMIT):
+    """
+    Keyset (cursor) pagination over `query`.
+
+    Reads `limit`, `after` and `sort` from the request arguments. Rows are
+    always ordered by the primary key of `model`, optionally preceded by one
+    of the `sortable` column names (prefix with '-' for descending order).
+    Sortable columns are expected to be non nullable.
+
+    Returns a tuple with the items of the page and the headers to be added to
+    the response: `X-Total-Count`, and when there are more rows, `Link` with
+    rel="next" and `X-Next-Cursor`.
+    """
+    mapper = inspect(model)
+    pk = mapper.get_property_by_column(mapper.primary_key[0]).key
+    key = getattr(model, pk)
+    limit = _parse_limit(default_limit, max_limit)
+    column, desc = _parse_sort(model, pk, sortable)
+
+    total = count_query(query)
+
+    cursor = request.args.get('after')
+    if cursor:
+        value, last = decode_cursor(cursor)
+        last = _cursor_value(key, last)
+        if column is not None:
+            value = _cursor_value(column, value)
+        if column is None:
+            criteria = key < last if desc else key > last
+        elif desc:
+            criteria = or_(column < value, and_(column == value, key < last))
+        else:
+            criteria = or_(column > value, and_(column == value, key > last))
+        query = query.filter(criteria)
+
+    if column is not None:
+        # the cursor is built from it, even when pruned by sparse_fields()
+        query = query.options(undefer(column))
+
+    order = [column] if column is not None else []
+    order.append(key)
+    query = query.order_by(*[c.desc() if desc else c.asc() for c in order])
+
+    items = query.limit(limit + 1).all()
+    headers = {'X-Total-Count': total}
+
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        value = getattr(last, column.key) if column is not None else None
+        next_cursor = encode_cursor([value, getattr(last, pk)])
+        args = request.args.copy()
+        args['after'] = next_cursor
+        args['limit'] = limit
+        headers['Link'] = '<{}?{}>; rel="next"'.format(request.base_url,
+                                                     url_encode(args))
+        headers['X-Next-Cursor'] = next_cursor
+
+    return items, headers
+
+
+def sparse_fields(schema_class, model=None):
+    """
+    Reads the comma separated `fields` request argument.
+
+    Returns a tuple with the field names to pass as `only` to `schema_class`
+    (None when all fields are requested) and a list of query options that
+    load only the matching columns of `model` (the primary key is always
+    loaded).
+    """
+    value = request.args.get('fields')
+    if not value:
+        return None, []
+    names = set(n.strip() for n in value.split(',') if n.strip())
+    unknown = names - set(schema_class._declared_fields)
+    if unknown:
+        raise BadRequest("Unknown fields: {}".format(
+            ', '.join(sorted(unknown))))
+    options = []
+    if model is not None:
+        mapper = inspect(model)
+        columns = [getattr(model, n) for n in sorted(names)
+                   if n in mapper.column_attrs]
+        if not columns:
+            pk = mapper.get_property_by_column(mapper.primary_key[0]).key
+            columns = [getattr(model, pk)]
+        options.append(load_only(*columns))
+    return tuple(sorted(names)), options
+
+
+def include_options(model, allowed):
+    """
+    Reads the comma separated `include` request argument, naming which of the
+    `allowed` relationship paths of `model` (dotted for nested ones, like
+    'entity.address') must be returned.
+
+    Returns a tuple with the paths to `exclude` from the schema and a list of
+    query options loading the included relationships with `selectinload` and
+    skipping the rest with `noload`.
+    """
+    value = request.args.get('include') or ''
+    included = set(n.strip() for n in value.split(',') if n.strip())
+    unknown = included - set(allowed)
+    if unknown:
+        raise BadRequest("Can't include: {}".format(', '.join(sorted(unknown))))
+    for path in list(included):
+        parts = path.split('.')
+        included.update('.'.join(parts[:i]) for i in range(1, len(parts)))
+
+    mapper = inspect(model)
+    exclude, options = [], []
+    for path in sorted(allowed):
+        parts = path.split('.')
+        if len(parts) > 1 and '.'.join(parts[:-1]) not in included:
+            continue  # the parent relationship isn't loaded at all
+        loader, cls = None, model
+        for i, part in enumerate(parts, 1):
+            attr = getattr(cls, part)
+            if i == len(parts) and path not in included:
+                loader = loader.noload(attr) if loader else noload(attr)
+                exclude.append(path)
+            else:
+                loader = loader.selectinload(attr) if loader \
+                         else selectinload(attr)
+            cls = attr.property.mapper.class_
+        options.append(loader)
+        if len(parts) == 1 and path in included:
+            # foreign keys are needed to load the related rows
+            options.extend(undefer(mapper.get_property_by_column(c).key)
+                           for c in attr.property.local_columns)
+    return tuple(exclude), options
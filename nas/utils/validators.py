@@ -1,22 +1,51 @@
 # -*- coding: utf-8 -*-
 
 import re
+from functools import lru_cache
+
+
+_CUIT_RE = re.compile(r'[0-9]{11}$')
+_CBU_RE = re.compile(r'[0-9]{22}$')
+
+_CUIT_WEIGHTS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+_CBU_BANK_WEIGHTS = (7, 1, 3, 9, 7, 1, 3)
+_CBU_ACCOUNT_WEIGHTS = (3, 9, 7, 1, 3, 9, 7, 1, 3, 9, 7, 1, 3)
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """NumPy, imported on first bulk validation, or None if not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def normalize_cuit(cuit):
+    return str(cuit).replace("-", "")
+
+
+def normalize_cbu(cbu):
+    return str(cbu).replace(" ", "")
+
+
+def _weighted_sum(digits, weights):
+    return sum([int(d)*w for d, w in zip(digits, weights)])
+
 
 def validate_cuit(cuit):
     """
     Validates CUIT (Argentina) - Clave Única de Identificación Tributaria
     from: http://python.org.ar/pyar/Recetario/ValidarCuit by Mariano Reingart
     """
-    cuit = str(cuit).replace("-", "") # normalize
+    cuit = normalize_cuit(cuit)
     # validaciones mínimas
-    if not re.match(r'\d{11}$', cuit):
+    if not _CUIT_RE.match(cuit):
         return False
 
-    base = [5, 4, 3, 2, 7, 6, 5, 4, 3, 2]
-
     # calculo digito verificador
-    aux = sum([int(cuit[i])*base[i] for i in range(10)])
-    aux = 11 - (aux % 11)
+    aux = 11 - (_weighted_sum(cuit, _CUIT_WEIGHTS) % 11)
 
     if aux == 11:
         aux = 0
@@ -28,20 +57,76 @@ def validate_cuit(cuit):
 
 def validate_cbu(cbu):
     """Validates CBU (Argentina) - Clave Bancaria Uniforme"""
-    cbu = str(cbu).replate(" ", "") # normalize
+    cbu = normalize_cbu(cbu)
     # validaciones minimas
-    if not re.match(r'\d{22}$', cbu):
+    if not _CBU_RE.match(cbu):
         return False
 
     # calculo digito verificador banco
-    base = [7, 1, 3, 9, 7, 1, 3]
-    aux = sum([int(cbu[i])*base[i] for i in range(7)])
-
-    if (10 - (aux % 10)) != int(cbu[7]):
+    aux = _weighted_sum(cbu[:7], _CBU_BANK_WEIGHTS)
+    if (10 - (aux % 10)) % 10 != int(cbu[7]):
         return False
 
     # calculo digito verificador cuenta
-    base = [3, 9, 7, 1, 3, 9, 7, 1, 3, 9, 7, 1, 3]
-    aux = sum([int(cbu[i+8])*base[i] for i in range(13)])
+    aux = _weighted_sum(cbu[8:21], _CBU_ACCOUNT_WEIGHTS)
+    return (10 - (aux % 10)) % 10 == int(cbu[21])
+
+
+def _digit_matrix(np, values, width):
+    """
+    Returns the indexes of `values` having `width` ascii digits and a matrix
+    with their digits, one row per value.
+    """
+    shaped = [i for i, v in enumerate(values)
+              if len(v) == width and v.isascii()]
+    buf = ''.join([values[i] for i in shaped]).encode('ascii')
+    matrix = np.frombuffer(buf, dtype=np.uint8).reshape(-1, width)
+    matrix = matrix.astype(np.int64) - ord('0')
+    digits = ((matrix >= 0) & (matrix <= 9)).all(axis=1)
+    return np.array(shaped, dtype=np.intp), matrix, digits
+
+
+def validate_cuits(cuits):
+    """
+    Validates many CUITs at once.
+
+    Returns a tuple with the list of booleans telling which values are valid
+    and the list of normalized values. With NumPy installed the check digits
+    of all values are computed as one matrix product, otherwise it falls
+    back to `validate_cuit`; the result is the same.
+    """
+    normalized = [normalize_cuit(c) for c in cuits]
+    np = _numpy()
+    if np is None:
+        return [validate_cuit(c) for c in normalized], normalized
+
+    idx, matrix, valid = _digit_matrix(np, normalized, 11)
+    aux = 11 - (matrix[:, :10] @ np.array(_CUIT_WEIGHTS)) % 11
+    aux[aux == 11] = 0
+    aux[aux == 10] = 9
+    valid &= aux == matrix[:, 10]
+
+    mask = np.zeros(len(normalized), dtype=bool)
+    mask[idx] = valid
+    return mask.tolist(), normalized
+
+
+def validate_cbus(cbus):
+    """
+    Validates many CBUs at once.
+
+    Same as `validate_cuits` but for CBU values.
+    """
+    normalized = [normalize_cbu(c) for c in cbus]
+    np = _numpy()
+    if np is None:
+        return [validate_cbu(c) for c in normalized], normalized
+
+    idx, matrix, valid = _digit_matrix(np, normalized, 22)
+    bank = (10 - (matrix[:, :7] @ np.array(_CBU_BANK_WEIGHTS)) % 10) % 10
+    account = (10 - (matrix[:, 8:21] @ np.array(_CBU_ACCOUNT_WEIGHTS)) % 10) % 10
+    valid &= (bank == matrix[:, 7]) & (account == matrix[:, 21])
 
-    return (10 - (aux % 10)) == int(cbu[21])
+    mask = np.zeros(len(normalized), dtype=bool)
+    mask[idx] = valid
+    return mask.tolist(), normalized
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+"""
+    nas.wsgi
+    ~~~~~~~~
+
+    WSGI entry point. Importing it creates the application, configures the
+    ORM mappers and creates the engine (no connection is opened), so a
+    prefork server loading it once in the master process, like
+    ``gunicorn --preload nas.wsgi:app``, does that work once instead of on
+    every worker spawn.
+
+    :copyright: (c) 2017 by Augusto Roccasalva
+    :license: MIT, see LICENSE for more details.
+"""
+
+import gc
+
+from sqlalchemy.orm import configure_mappers
+
+from nas.application import create_app
+from nas.models import db
+
+
+app = application = create_app()
+
+configure_mappers()
+with app.app_context():
+    db.get_engine()
+
+# keep preloaded objects out of the collector, so workers don't touch (and
+# copy) their memory pages
+if hasattr(gc, 'freeze'):
+    gc.freeze()
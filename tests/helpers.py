@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""Row by row reference computations the set based code is checked with."""
+
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from nas.models import Document, Payment
+from nas.models.supplier import _as_date
+
+
+OPEN = (Document.STATUS_PENDING, Document.STATUS_EXPIRED)
+
+
+def make_documents(supplier, n, seed=0, start=date(2020, 1, 1)):
+    """
+    Adds `n` documents with random totals and few distinct dates, so there
+    are ties, NULL dates, expired and already paid documents.
+    """
+    rnd = random.Random(seed)
+    dates = [start + timedelta(days=d) for d in range(5)] + [None]
+    documents = []
+    for i in range(n):
+        documents.append(Document(
+            supplier=supplier, point_sale=1, number=i + 1,
+            total=Decimal(rnd.randint(100, 10000)) / 100,
+            issue_date=rnd.choice(dates), expiration_date=rnd.choice(dates),
+            doc_status=rnd.choice([Document.STATUS_PENDING] * 3 +
+                                  [Document.STATUS_EXPIRED,
+                                   Document.STATUS_PAID])))
+    return documents
+
+
+def pay_some(documents, seed=0):
+    """Partially pays a random subset of `documents`."""
+    rnd = random.Random(seed)
+    for document in documents:
+        if document.doc_status in OPEN and rnd.random() < 0.3:
+            half = (document.total / 2).quantize(Decimal('0.01'))
+            document.add_payment(Payment(amount=half,
+                                         date=date(2020, 1, 1)))
+
+
+def fifo_allocation(documents, amount):
+    """Expected `(document_id, amount)` allocations, one document at a time."""
+    def order(doc):
+        return (doc.expiration_date is None,
+                doc.expiration_date or date.min, doc.issue_date is None,
+                doc.issue_date or date.min, doc.id)
+
+    allocations = []
+    for doc in sorted((d for d in documents if d.doc_status in OPEN),
+                      key=order):
+        if amount <= 0:
+            break
+        balance = doc.total - doc.paid
+        if balance <= 0:
+            continue
+        allocated = min(balance, amount)
+        allocations.append((doc.id, allocated))
+        amount -= allocated
+    return allocations
+
+
+def expected_aggregates(supplier):
+    """Debt, expired amount and expiration date summed from documents."""
+    documents = Document.query.filter_by(supplier_id=supplier.supplier_id)\
+                              .filter(Document.doc_status.in_(OPEN)).all()
+    dates = [d.expiration_date for d in documents
+             if d.expiration_date is not None]
+    return (sum((d.total for d in documents), Decimal(0)),
+            sum((d.total for d in documents
+                 if d.doc_status == Document.STATUS_EXPIRED), Decimal(0)),
+            min(dates) if dates else None)
+
+
+def aggregates(supplier):
+    """Debt, expired amount and expiration date kept on `supplier`."""
+    return (supplier.debt, supplier.expired,
+            _as_date(supplier.expiration_date))
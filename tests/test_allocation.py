@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from nas.models import Supplier, Document, Payment
+from nas.models import allocation, supplier as supplier_module
+
+from .helpers import (make_documents, pay_some, fifo_allocation,
+                      expected_aggregates, aggregates)
+
+
+def _document(supplier, number, total, expiration_date, issue_date):
+    return Document(supplier=supplier, point_sale=1, number=number,
+                    total=Decimal(total), expiration_date=expiration_date,
+                    issue_date=issue_date)
+
+
+@pytest.fixture
+def supplier(session):
+    supplier = Supplier(rz=u'ACME')
+    session.add(supplier)
+    return supplier
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('by_supplier', [True, False])
+def test_allocation_matches_row_by_row(session, supplier, monkeypatch, seed,
+                                       by_supplier):
+    # small chunks so given documents span several queries
+    monkeypatch.setattr(allocation, 'IN_CHUNK_SIZE', 7)
+    monkeypatch.setattr(supplier_module, 'IN_CHUNK_SIZE', 7)
+    documents = make_documents(supplier, 40, seed)
+    session.commit()
+    pay_some(documents, seed)
+    session.commit()
+
+    amount = Decimal('750.00')
+    expected = fifo_allocation(documents, amount)
+    payment = Payment(amount=amount, date=date(2020, 2, 1))
+    if by_supplier:
+        result = payment.allocate(supplier=supplier)
+    else:
+        result = payment.allocate(documents=documents)
+    session.commit()
+
+    assert result == expected
+    assert aggregates(supplier) == expected_aggregates(supplier)
+    paid = dict(result)
+    for document in documents:
+        if document.id in paid:
+            assert document.balance >= 0
+            assert (document.doc_status == Document.STATUS_PAID) == \
+                (document.balance == 0)
+
+
+def test_allocation_ties_and_null_dates(session, supplier):
+    day = date(2020, 1, 10)
+    documents = [
+        _document(supplier, 1, '10', day, None),
+        _document(supplier, 2, '10', day, date(2020, 1, 1)),
+        _document(supplier, 3, '10', None, date(2019, 1, 1)),
+        _document(supplier, 4, '10', day, None),
+        _document(supplier, 5, '10', date(2020, 1, 5), None),
+    ]
+    session.commit()
+
+    payment = Payment(amount=Decimal('45'), date=day)
+    result = payment.allocate(documents=list(reversed(documents)))
+    session.commit()
+
+    # earliest expiration first, NULL issue dates after dated ones, then id;
+    # documents without expiration date last
+    assert result == [(5, Decimal('10')), (2, Decimal('10')),
+                      (1, Decimal('10')), (4, Decimal('10')),
+                      (3, Decimal('5'))]
+    assert aggregates(supplier) == (Decimal('10'), Decimal('0'), None)
+    assert aggregates(supplier) == expected_aggregates(supplier)
+
+
+def test_allocation_requires_supplier_or_documents(session, supplier):
+    with pytest.raises(ValueError):
+        Payment(amount=Decimal('1'), date=date.today()).allocate()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+import click
+from flask import Flask
+
+from nas import commands
+from nas.application import create_app
+from nas.config import ProductionConfig
+from nas.utils.cache import FileSystemCache, LRUCache
+
+
+def test_production_settings_read_on_create_app(monkeypatch, tmpdir):
+    monkeypatch.setenv('NAS_DATABASE_URL', 'sqlite://')
+    monkeypatch.setenv('NAS_PAGINATION_COUNT_TTL', '5')
+    monkeypatch.setenv('NAS_METRICS_ENABLED', 'yes')
+    monkeypatch.setenv('NAS_RESPONSE_CACHE_DIR', str(tmpdir.join('cache')))
+    app = create_app(ProductionConfig, with_api=False)
+
+    assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite://'
+    assert app.config['PAGINATION_COUNT_TTL'] == 5
+    assert app.config['METRICS_ENABLED'] is True
+    assert isinstance(app.extensions['nas_cache'].backend, FileSystemCache)
+    # the class itself is left alone
+    assert ProductionConfig.SQLALCHEMY_DATABASE_URI == 'postgresql:///nas'
+
+    monkeypatch.delenv('NAS_RESPONSE_CACHE_DIR')
+    monkeypatch.delenv('NAS_METRICS_ENABLED')
+    app = create_app(ProductionConfig, with_api=False)
+    assert app.config['METRICS_ENABLED'] is False
+    assert isinstance(app.extensions['nas_cache'].backend, LRUCache)
+
+
+def _with_api(monkeypatch, command):
+    calls = []
+    monkeypatch.setattr('nas.application.create_app', lambda with_api:
+                        calls.append(with_api) or Flask('test'))
+    with click.Context(command):
+        commands.create_app()
+    return calls[0]
+
+
+def test_cli_skips_api(monkeypatch):
+    # `flask <command>` loads the app from its group to find the command
+    assert _with_api(monkeypatch, commands.cli) is False
+    assert _with_api(monkeypatch, commands.expire_documents) is False
+    assert _with_api(monkeypatch, click.Command('routes')) is True
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from nas.models import Supplier, Document, expire_documents
+
+from .helpers import make_documents, expected_aggregates, aggregates
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_sweep_matches_row_by_row(session, seed):
+    as_of = date(2020, 1, 3)
+    swept, by_row = Supplier(rz=u'Swept'), Supplier(rz=u'By row')
+    session.add_all([swept, by_row])
+    documents = make_documents(swept, 30, seed)
+    twins = make_documents(by_row, 30, seed)
+    session.commit()
+
+    # row by row: each status change goes through the ORM listeners
+    for document in twins:
+        if document.doc_status == Document.STATUS_PENDING and \
+                document.expiration_date is not None and \
+                document.expiration_date < as_of:
+            document.doc_status = Document.STATUS_EXPIRED
+    session.commit()
+    due = [d for d in documents if d.doc_status == Document.STATUS_PENDING
+           and d.expiration_date is not None and d.expiration_date < as_of]
+
+    assert expire_documents(as_of) == len(due)
+    session.commit()
+
+    assert [d.doc_status for d in documents] == \
+        [d.doc_status for d in twins]
+    assert aggregates(swept) == aggregates(by_row)
+    assert aggregates(swept) == expected_aggregates(swept)
+
+
+def test_sweep_without_due_documents(session):
+    supplier = Supplier(rz=u'ACME')
+    session.add(Document(supplier=supplier, point_sale=1, number=1,
+                         total=Decimal('10'),
+                         expiration_date=date(2020, 2, 1)))
+    session.commit()
+
+    assert expire_documents(date(2020, 1, 1)) == 0
+    assert aggregates(supplier) == (Decimal('10'), Decimal('0'),
+                                    date(2020, 2, 1))
+
+
+@pytest.mark.parametrize('status', [Document.STATUS_PENDING,
+                                    Document.STATUS_EXPIRED,
+                                    Document.STATUS_PAID])
+def test_move_document_between_suppliers(session, status):
+    first, second = Supplier(rz=u'First'), Supplier(rz=u'Second')
+    session.add_all([first, second])
+    documents = make_documents(first, 10, seed=1)
+    moved = Document(supplier=first, point_sale=1, number=99,
+                     total=Decimal('12.34'), doc_status=status,
+                     expiration_date=date(2019, 12, 1))
+    make_documents(second, 10, seed=2)
+    session.commit()
+
+    moved.supplier = second
+    session.commit()
+    assert aggregates(first) == expected_aggregates(first)
+    assert aggregates(second) == expected_aggregates(second)
+
+    # and back, through the foreign key owner relationship of the other side
+    documents[0].supplier = second
+    moved.supplier = first
+    session.commit()
+    assert aggregates(first) == expected_aggregates(first)
+    assert aggregates(second) == expected_aggregates(second)
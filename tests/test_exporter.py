@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import gzip
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+from nas.models import Supplier, Document, Payment
+
+
+def _documents(session):
+    supplier = Supplier(rz=u'ACME')
+    unpaid = Document(supplier=supplier, point_sale=1, number=1,
+                      total=Decimal('10'), issue_date=date(2020, 1, 1))
+    paid = Document(supplier=supplier, point_sale=1, number=2,
+                    total=Decimal('20.5'), issue_date=date(2020, 1, 2))
+    session.add_all([unpaid, paid])
+    session.commit()
+    Payment(amount=Decimal('20.5'), date=date(2020, 1, 3))\
+        .allocate(documents=[paid])
+    session.commit()
+
+
+def test_csv_amounts(app, session):
+    _documents(session)
+    resp = app.test_client().get('/api/documents/export?format=csv')
+    rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True))))
+    assert [(r['total'], r['paid'], r['balance'], r['payment_amount'])
+            for r in rows] == [('10.00', '0.00', '10.00', ''),
+                               ('20.50', '20.50', '0.00', '20.50')]
+
+
+def test_ndjson_gzipped(app, session):
+    _documents(session)
+    resp = app.test_client().get('/api/documents/export',
+                                 headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp.headers['Vary']
+    lines = gzip.decompress(resp.get_data()).decode('utf-8').splitlines()
+    documents = [json.loads(line) for line in lines]
+    assert [(d['total'], d['paid'], d['balance']) for d in documents] == \
+        [('10.00', '0.00', '10.00'), ('20.50', '20.50', '0.00')]
+
+
+def test_identity_without_accept_encoding(app, session):
+    _documents(session)
+    resp = app.test_client().get('/api/documents/export',
+                                 headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in resp.headers
+    assert len(resp.get_data(as_text=True).splitlines()) == 2
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+from nas.importer import SupplierImporter, read_csv, read_ndjson
+from nas.models import Supplier, FiscalData
+
+
+CSV = u'''\
+rz,cuit,fiscal_type,address_street,address_province,phone_number,email
+ACME SA,30-12345678-1,EXCENTO,San Martin,Mendoza,261 4000000,ventas@acme.com
+Sin CUIT,,,,,,
+CUIT Malo,30123456789,EXCENTO,,,,
+,20123456786,,,,,
+Repetido,30123456781,EXCENTO,,,,
+Sin Calle,20123456786,,,Mendoza,,
+'''
+
+NDJSON = u'''\
+{"rz": "ACME SA", "cuit": "30-12345678-1", "fiscal_type": "EXCENTO", \
+"address": [{"street": "San Martin", "province": "Mendoza"}], \
+"phone": [{"number": "261 4000000"}], "email": [{"email": "ventas@acme.com"}]}
+{"rz": "Sin CUIT"}
+
+{"rz": "CUIT Malo", "cuit": "30123456789", "fiscal_type": "EXCENTO"}
+{"cuit": "20123456786"}
+{"rz": "Repetido", "cuit": "30123456781", "fiscal_type": "EXCENTO"}
+{"rz": "Sin Calle", "cuit": "20123456786", \
+"address": [{"province": "Mendoza"}]}
+'''
+
+EXPECTED_ERRORS = {
+    2: 'CUIT invalid',
+    3: "'rz' field must be present",
+    4: 'Duplicate CUIT',
+    5: "'street' field of address must be present",
+}
+
+
+def _import(session, records, chunk_size=2):
+    importer = SupplierImporter(session, chunk_size=chunk_size)
+    return importer.import_records(records)
+
+
+def _suppliers():
+    return dict((s.rz, s) for s in Supplier.query)
+
+
+@pytest.mark.parametrize('reader, data', [(read_csv, CSV),
+                                          (read_ndjson, NDJSON)])
+def test_import(session, reader, data):
+    imported, errors = _import(session, reader(io.StringIO(data)))
+
+    assert (imported, errors) == (2, EXPECTED_ERRORS)
+    suppliers = _suppliers()
+    assert sorted(suppliers) == [u'ACME SA', u'Sin CUIT']
+    acme = suppliers[u'ACME SA']
+    assert acme.fiscal_data.cuit == u'30-12345678-1'
+    assert acme.fiscal_data.fiscal_type == FiscalData.FISCAL_EXCENTO
+    assert [a.street for a in acme.address] == [u'San Martin']
+    assert [p.number for p in acme.phone] == [u'261 4000000']
+    assert [e.email for e in acme.email] == [u'ventas@acme.com']
+    assert suppliers[u'Sin CUIT'].fiscal_data.fiscal_type == \
+        FiscalData.FISCAL_CONSUMIDOR_FINAL
+
+
+def test_csv_and_ndjson_records_match():
+    csv_records = list(read_csv(io.StringIO(CSV)))
+    ndjson_records = list(read_ndjson(io.StringIO(NDJSON)))
+    assert len(csv_records) == len(ndjson_records)
+    for a, b in zip(csv_records, ndjson_records):
+        assert a['rz'] == b.get('rz')
+        assert a['address'] == b.get('address', [])
+
+
+def test_duplicates_of_existing_suppliers(session):
+    _import(session, read_ndjson(io.StringIO(NDJSON)))
+    imported, errors = _import(session, [
+        {'rz': u'Otra', 'cuit': u'30123456781'},
+        {'rz': u'Otra mas', 'cuit': u'20-12345678-6'},
+        {'rz': u'Y otra', 'cuit': u'20123456786'},
+    ])
+    assert (imported, errors) == (1, {0: 'Duplicate CUIT',
+                                      2: 'Duplicate CUIT'})
+    assert _suppliers()[u'Otra mas'].fiscal_data.cuit == u'20-12345678-6'
+
+
+def test_invalid_records_dont_reserve_cuits(session):
+    imported, errors = _import(session, [
+        {'rz': u'Tipo Malo', 'cuit': u'30123456781', 'sup_type': u'X'},
+        {'rz': u'ACME SA', 'cuit': u'30123456781'},
+    ])
+    assert (imported, errors) == (1, {0: 'Invalid sup_type'})
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from nas.application import create_app
+from nas.config import TestingConfig
+from nas.models import db
+
+
+class MetricsConfig(TestingConfig):
+    METRICS_ENABLED = True
+
+
+@pytest.fixture
+def client():
+    app = create_app(MetricsConfig)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def _timings(resp):
+    segments = [s.strip() for s in resp.headers['Server-Timing'].split(',')]
+    return dict(s.split(';', 1) for s in segments)
+
+
+def test_server_timing(client):
+    timings = _timings(client.get('/api/banks'))
+    assert set(timings) == {'db', 'encode', 'total'}
+    assert 'nas_encode_duration_seconds_count{endpoint="api.bank.list"} 1' \
+        in client.get('/api/_metrics').get_data(as_text=True)
+
+
+def test_failed_statement_leaves_no_state(client):
+    connection = db.session.connection()
+    with pytest.raises(DBAPIError):
+        connection.execute('SELECT * FROM missing_table')
+    db.session.rollback()
+    assert not [k for k in db.session.connection().info
+                if k.startswith('nas_')]
+    assert 'db' in _timings(client.get('/api/banks'))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from sqlalchemy import select
+
+from nas.application import create_app
+from nas.config import TestingConfig
+from nas.models import db, Bank, Supplier
+from nas.utils.query import count_query, encode_cursor
+
+
+class PaginationConfig(TestingConfig):
+    PAGINATION_COUNT_TTL = 60
+    PAGINATION_COUNT_CACHE_SIZE = 2
+
+
+@pytest.fixture
+def app():
+    app = create_app(PaginationConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Bank(name=u'Banco {}'.format(i))
+                            for i in range(5)])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.mark.parametrize('cursor', [
+    [u'Banco 1', u'x'],
+    [u'Banco 1', True],
+    [1, 2],
+    [{}, 2],
+])
+def test_mistyped_cursor(app, cursor):
+    args = {'sort': 'name', 'after': encode_cursor(cursor)}
+    assert app.test_client().get('/api/banks', query_string=args)\
+              .status_code == 400
+
+
+def test_cursor_pages(app):
+    client = app.test_client()
+    resp = client.get('/api/banks?sort=-name&limit=3')
+    rest = client.get('/api/banks', query_string={
+        'sort': '-name', 'after': resp.headers['X-Next-Cursor']})
+    assert rest.status_code == 200
+    names = [b['name'] for b in resp.json + rest.json]
+    assert names == sorted(names, reverse=True)
+    assert len(names) == 5
+
+
+def test_count_invalidated_on_commit(app):
+    with app.test_request_context():
+        assert count_query(Bank.query) == 5
+        db.session.add(Bank(name=u'Banco 5'))
+        db.session.commit()
+        assert count_query(Bank.query) == 6
+        # changes to unrelated tables keep the total
+        db.session.add(Supplier(rz=u'ACME'))
+        db.session.commit()
+        db.session.execute(Bank.__table__.delete())  # not seen by the cache
+        assert count_query(Bank.query) == 6
+        db.session.rollback()
+
+
+def test_count_cache_is_bounded(app):
+    counts = app.extensions['nas_count_cache']
+    with app.test_request_context():
+        for i in range(5):
+            count_query(Bank.query.filter(Bank.id > i))
+        subquery = select([Bank.id]).where(Bank.name == u'Banco 1')
+        assert count_query(Supplier.query.filter(
+            Supplier.supplier_id.in_(subquery))) == 0
+    assert len(counts._data) == 2
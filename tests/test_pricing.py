@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+import pytest
+
+from nas.commands import update_prices
+from nas.models import Supplier, Product, ProductSupplierInfo, load_price_list
+
+
+@pytest.fixture
+def supplier(session):
+    supplier = Supplier(rz=u'ACME')
+    for i in range(3):
+        product = Product(code=u'P{}'.format(i),
+                          description=u'Product {}'.format(i))
+        session.add(ProductSupplierInfo(supplier=supplier, product=product,
+                                        code=u'C{}'.format(i),
+                                        base_cost=Decimal('10')))
+    session.commit()
+    return supplier
+
+
+def _costs(supplier_id):
+    return dict((i.code, i.base_cost) for i in ProductSupplierInfo.query
+                .filter_by(supplier_id=supplier_id))
+
+
+def test_invalid_rows_reported(app, supplier, tmpdir):
+    price_list = tmpdir.join('prices.csv')
+    price_list.write(u'code,cost\nC0,12.5\nC1,abc\n,3\nC2,-1\nC9,4\n'
+                     u'C2,1e9\n')
+    supplier_id = supplier.supplier_id
+    result = app.test_cli_runner().invoke(
+        update_prices, [str(supplier_id), '--file', str(price_list)])
+
+    assert result.exit_code == 0, result.output
+    assert "record 2: cost 'abc' is not a number" in result.output
+    assert "record 3: 'code' field must be present" in result.output
+    assert "record 4: cost '-1' out of range" in result.output
+    assert "record 6: cost '1e9' out of range" in result.output
+    assert "unknown code: C9" in result.output
+    assert "1 prices updated, 1 unknown codes, 4 rejected" in result.output
+    assert _costs(supplier_id) == {u'C0': Decimal('12.50'),
+                                u'C1': Decimal('10'), u'C2': Decimal('10')}
+
+
+def test_invalid_cost_raises(session, supplier):
+    with pytest.raises(ValueError):
+        load_price_list(supplier.supplier_id, [(u'C0', u'x')])
+    # no staging table was left behind
+    assert load_price_list(supplier.supplier_id,
+                           [(u'C0', u'11'), (u'C1', u'10')]) == (1, [])
+    assert load_price_list(supplier.supplier_id, [(u'C3', u'1')]) == \
+        (0, [u'C3'])
+    session.commit()
+    assert _costs(supplier.supplier_id)[u'C0'] == Decimal('11')
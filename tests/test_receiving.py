@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+import pytest
+
+from nas.models import Supplier, PurchaseOrder, PurchaseOrderItem
+from nas.models import receive_items
+
+
+@pytest.fixture
+def order(session):
+    order = PurchaseOrder(supplier=Supplier(rz=u'ACME'), point_sale=1,
+                          number=1, po_status=PurchaseOrder.STATUS_CONFIRMED)
+    order.items = [PurchaseOrderItem(sku=u'A', quantity=10),
+                   PurchaseOrderItem(sku=u'B', quantity=5)]
+    session.add(order)
+    session.commit()
+    return order
+
+
+def _delivery(order, received, returned=0):
+    return [{'id': item.id, 'received': received, 'returned': returned}
+            for item in order.items]
+
+
+def test_partial_and_completed(session, order):
+    assert receive_items(_delivery(order, 5), date(2020, 1, 1)) == \
+        ([order.id], {})
+    session.commit()
+    assert order.po_status == PurchaseOrder.STATUS_PARTIAL
+    assert order.receival_date == date(2020, 1, 1)
+
+    receive_items([{'id': order.items[0].id, 'received': 5}],
+                  date(2020, 1, 2))
+    session.commit()
+    assert order.po_status == PurchaseOrder.STATUS_COMPLETED
+    assert order.receival_date == date(2020, 1, 2)
+
+
+@pytest.mark.parametrize('received', [0, -1])
+def test_returns_only_keep_status(session, order, received):
+    assert receive_items(_delivery(order, received, returned=2),
+                         date(2020, 1, 1)) == ([order.id], {})
+    session.commit()
+    assert order.po_status == PurchaseOrder.STATUS_CONFIRMED
+    assert order.receival_date is None
+    assert [i.quantity_returned for i in order.items] == [2, 2]
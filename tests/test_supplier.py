@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from nas.models import Supplier, Document, Payment
+
+from .helpers import (OPEN, make_documents, pay_some, expected_aggregates,
+                      aggregates)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_aggregates_after_add_pay_delete(session, seed):
+    supplier = Supplier(rz=u'ACME')
+    session.add(supplier)
+    documents = make_documents(supplier, 20, seed)
+    session.commit()
+    assert aggregates(supplier) == expected_aggregates(supplier)
+
+    pay_some(documents, seed)
+    Payment(amount=Decimal('300'), date=date(2020, 2, 1))\
+        .allocate(supplier=supplier)
+    session.commit()
+    assert aggregates(supplier) == expected_aggregates(supplier)
+
+    # the earliest expiring open documents, so it has to be recomputed
+    open_documents = sorted(
+        (d for d in documents if d.doc_status in OPEN and
+         d.expiration_date is not None and not d.document_payments),
+        key=lambda d: (d.expiration_date, d.id))
+    for document in open_documents[:3]:
+        session.delete(document)
+    session.delete(next(d for d in documents
+                        if d.doc_status == Document.STATUS_PAID and
+                        not d.document_payments))
+    session.commit()
+    assert aggregates(supplier) == expected_aggregates(supplier)
+
+
+def test_delete_every_document(session):
+    supplier = Supplier(rz=u'ACME')
+    documents = make_documents(supplier, 5, seed=3)
+    session.add(supplier)
+    session.commit()
+    for document in documents:
+        session.delete(document)
+    session.commit()
+    assert aggregates(supplier) == (Decimal(0), Decimal(0), None)
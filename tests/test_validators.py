@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from nas.utils import validators
+from nas.utils.validators import (validate_cuit, validate_cbu, validate_cuits,
+                                  validate_cbus)
+
+
+CUITS = [u'30-12345678-1', u'30123456789', u'20123456786', u'2012345678',
+         u'2O123456786', u'', u'20 12345678 6', u'٢0123456786']
+CBUS = [u'2850590940090418135201', u'2850590940090418135202',
+        u'28505909 40090418135201', u'285059094009041813520', u'']
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(validators, '_numpy', lambda: None)
+    return request.param
+
+
+def test_validate_cuits(backend):
+    mask, normalized = validate_cuits(CUITS)
+    assert type(mask) is list
+    assert all(type(valid) is bool for valid in mask)
+    assert mask == [validate_cuit(c) for c in CUITS]
+    assert normalized[0] == u'30123456781'
+
+
+def test_validate_cbus(backend):
+    mask, _ = validate_cbus(CBUS)
+    assert type(mask) is list
+    assert mask == [validate_cbu(c) for c in CBUS]
+
+
+def test_empty(backend):
+    assert validate_cuits([]) == ([], [])
+    assert validate_cbus([]) == ([], [])